@@ -0,0 +1,102 @@
+"""
+The `IIRFilter` class filters live sensor data as it arrives. It is a Butterworth filter in second-order
+sections form that carries its state between calls, so a stream can be filtered a chunk or a single
+sample at a time and the result is identical to filtering the whole series at once.
+"""
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+
+class IIRFilter:
+    FILTER_TYPES = ('lowpass', 'highpass', 'bandpass')
+
+    def __init__(self, cutoff, fs: float, btype: str = 'lowpass', order: int = 5, channels: int = 1, steady_state: bool = True) -> None:
+        """
+        Design the filter and start it with no history.
+
+        :param cutoff: cutoff frequency in Hz, or a `(low, high)` pair for 'bandpass'
+        :param fs: sample frequency in Hz, 1 / the sensor's timestep
+        :param btype: 'lowpass', 'highpass' or 'bandpass'
+        :param order: order of the Butterworth design; second-order sections keep high orders stable
+        :param channels: number of signals filtered side by side, one per column of the input
+        :param steady_state: start the filter as if the first sample had always been present, which avoids
+            the start-up transient of a filter starting from zero
+        """
+        if btype not in self.FILTER_TYPES:
+            raise ValueError(f"btype must be one of {self.FILTER_TYPES}, got '{btype}'")
+        self.sos = butter(order, cutoff, btype=btype, fs=fs, output='sos')
+        self.channels: int = channels
+        self.steady_state: bool = steady_state
+        self.zi = None
+        self.reset()
+
+    @classmethod
+    def lowpass(cls, cutoff: float, fs: float, order: int = 5, channels: int = 1, steady_state: bool = True):
+        return cls(cutoff, fs, 'lowpass', order, channels, steady_state)
+
+    @classmethod
+    def highpass(cls, cutoff: float, fs: float, order: int = 5, channels: int = 1, steady_state: bool = True):
+        return cls(cutoff, fs, 'highpass', order, channels, steady_state)
+
+    @classmethod
+    def bandpass(cls, low: float, high: float, fs: float, order: int = 5, channels: int = 1, steady_state: bool = True):
+        return cls((low, high), fs, 'bandpass', order, channels, steady_state)
+
+    @classmethod
+    def for_sensor(cls, sensor, cutoff, btype: str = 'lowpass', order: int = 5, channels: int = 1, steady_state: bool = True):
+        """
+        Design a filter for the sample rate of `sensor`.
+
+        :raises ValueError: if the sensor has too few samples to have a timestep
+        """
+        try:
+            timestep = sensor.get_timestep()
+        except ValueError as e:
+            raise ValueError(f"Can't design a filter without the sensor's sample rate: {e}") from e
+        if not timestep:
+            raise ValueError(f"Can't design a filter without the sensor's sample rate: {sensor.identifier} has no timestep")
+        return cls(cutoff, 1 / timestep, btype, order, channels, steady_state)
+
+    def reset(self, initial=None) -> None:
+        """
+        Forget the filter's history. If `initial` (one value, or one per channel) is given the filter
+        restarts in the steady state for that input; otherwise it is initialised from the next sample.
+        """
+        self.zi = None
+        if initial is not None:
+            self.__initialise(np.broadcast_to(np.asarray(initial, dtype=np.float64), (self.channels,)))
+
+    def __initialise(self, first: np.ndarray) -> None:
+        if self.steady_state:
+            self.zi = sosfilt_zi(self.sos)[:, :, None] * first# (sections, 2, channels)
+        else:
+            self.zi = np.zeros((self.sos.shape[0], 2, self.channels))
+
+    def filter(self, data) -> np.ndarray:
+        """
+        Filter the next chunk of samples, continuing from where the previous call stopped.
+
+        :param data: a 1-D array of samples for a single channel, or a `(samples, channels)` array
+        :return: the filtered samples, shaped like `data`
+        """
+        data = np.asarray(data, dtype=np.float64)
+        single = data.ndim == 1
+        samples = data[:, None] if single else data
+        if samples.shape[1] != self.channels:
+            raise ValueError(f"Expected {self.channels} channels, got {samples.shape[1]}")
+        if samples.shape[0] == 0:
+            return data.copy()
+
+        if self.zi is None:
+            self.__initialise(samples[0])
+        filtered, self.zi = sosfilt(self.sos, samples, axis=0, zi=self.zi)
+        return filtered[:, 0] if single else filtered
+
+    def step(self, sample):
+        """
+        Filter one new sample (or one per channel) in O(1).
+
+        :return: a float for a single channel, otherwise an array with one value per channel
+        """
+        filtered = self.filter(np.reshape(np.asarray(sample, dtype=np.float64), (1, self.channels)))[0]
+        return float(filtered[0]) if self.channels == 1 else filtered
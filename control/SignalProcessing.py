@@ -3,12 +3,14 @@ The signal processing class contains a number of static methods primarily for si
 This class is designed to work primarily with methods implemented within the Sensor class, such as get_timeseries() and get_timestep(). 
 """
 
+import weakref
+
 import pandas as pd
 import numpy as np 
 import matplotlib.pyplot as plt 
 import pandas as pd 
-from scipy import signal
-from scipy.signal import butter, lfilter, filtfilt, periodogram
+from scipy import fft, signal, stats
+from scipy.signal import butter, lfilter, filtfilt, sosfiltfilt, periodogram
 from scipy.interpolate import interp1d
 from statsmodels.tsa.stattools import adfuller
 
@@ -16,11 +18,49 @@ from statsmodels.tsa.stattools import adfuller
 
 import pywt
 
+from data_management.resampling import align
+
 class SignalProcessing:
+    # sensor -> results of expensive analyses, dropped when the sensor's data changes or it is garbage collected
+    _analysis_cache = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def __cached(sensor1:object, key, compute):
+        """
+        Return `compute()` for `sensor1`, computed once per version of the sensor's data. Objects without
+        a `data_version` are not cached. Cached arrays are made read-only since they are shared.
+        """
+        version = getattr(sensor1, 'data_version', None)
+        if version is None:
+            return compute()
+
+        entries = SignalProcessing._analysis_cache.get(sensor1)
+        if entries is None or entries[0] != version:
+            entries = (version, {})
+            SignalProcessing._analysis_cache[sensor1] = entries
+        results = entries[1]
+        if key not in results:
+            value = compute()
+            for array in value if isinstance(value, tuple) else (value,):
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+            results[key] = value
+        return results[key]
 
     @staticmethod
-    def __butter_lowpass(cutoff, fs, order):
-        return butter(order,cutoff, fs=fs, btype='low', analog=False)
+    def clear_cache(sensor1:object=None):
+        """
+        Drop the cached analyses of `sensor1`, or of every sensor if it is None.
+        """
+        if sensor1 is None:
+            SignalProcessing._analysis_cache.clear()
+        else:
+            SignalProcessing._analysis_cache.pop(sensor1, None)
+
+    @staticmethod
+    def __butter_sos(cutoff, fs, order, btype='lowpass'):
+        # second-order sections, the (b, a) form loses precision at higher orders and low cutoffs
+        return butter(order, cutoff, fs=fs, btype=btype, analog=False, output='sos')
 
     @staticmethod
     def signaltonoise(a, axis=0, ddof=0, detrend=False):
@@ -31,10 +71,6 @@ class SignalProcessing:
         sd = a.std(axis=axis, ddof=ddof)
         return np.where(sd == 0, 0, m/sd)
 
-    #TODO: band pass
-
-    #TODO: high pass
-
     @staticmethod
     def butter_lowpass_filter(sensor1:object,  cutoff, order:int=5, plot:bool=False):
         """
@@ -67,11 +103,31 @@ class SignalProcessing:
         the filtered data array `y`.
         """
     
+        return SignalProcessing.__butter_filter(sensor1, cutoff, 'lowpass', order, plot)
+
+    @staticmethod
+    def butter_highpass_filter(sensor1:object, cutoff, order:int=5, plot:bool=False):
+        """
+        Apply a zero-phase Butterworth high-pass filter with `cutoff` in Hz to the detrended sensor data,
+        as `butter_lowpass_filter` does for low-pass. For live data use `IIRFilter`.
+        """
+        return SignalProcessing.__butter_filter(sensor1, cutoff, 'highpass', order, plot)
+
+    @staticmethod
+    def butter_bandpass_filter(sensor1:object, low_cutoff, high_cutoff, order:int=5, plot:bool=False):
+        """
+        Apply a zero-phase Butterworth band-pass filter passing `low_cutoff` to `high_cutoff` Hz to the
+        detrended sensor data. For live data use `IIRFilter`.
+        """
+        return SignalProcessing.__butter_filter(sensor1, (low_cutoff, high_cutoff), 'bandpass', order, plot)
+
+    @staticmethod
+    def __butter_filter(sensor1:object, cutoff, btype:str, order:int, plot:bool):
         data = SignalProcessing.detrend(sensor1)
-        timestep = sensor1.get_timestep()
+        timestep = sensor1.get_timestep()# cached on the sensor
         fs = 1/timestep #sample frequency
-        b, a = SignalProcessing.__butter_lowpass(cutoff, fs, order=order)
-        y = filtfilt(b, a, data) # to avoid lag you must flip the output and pass it through the filter again. filtfilt does this for you
+        sos = SignalProcessing.__butter_sos(cutoff, fs, order=order, btype=btype)
+        y = sosfiltfilt(sos, data) # to avoid lag you must flip the output and pass it through the filter again. sosfiltfilt does this for you
         n = len(data)
         T = int(n/fs)
         t = np.linspace(0, T, n, endpoint=False)
@@ -105,11 +161,12 @@ class SignalProcessing:
         `False`, the function will return the frequency array `f` and the PSD array `Pxx_den`.
         """
 
-        data = sensor1.get_timeseries(numpy=True)
-        timestep = sensor1.get_timestep()
+        def compute():
+            data = sensor1.get_timeseries(numpy=True)
+            fs = 1/sensor1.get_timestep() #sample frequency
+            return periodogram(x=data, fs=fs)
 
-        fs = 1/timestep #sample frequency
-        f, Pxx_den = periodogram(x=data, fs=fs)
+        f, Pxx_den = SignalProcessing.__cached(sensor1, 'psd', compute)
         
         if plot:
             plt.semilogy(f, Pxx_den)
@@ -120,27 +177,23 @@ class SignalProcessing:
             return f, Pxx_den
 
     @staticmethod
-    def auto_correlation(sensor1:object, lags:int=10, plot:bool=False):
+    def auto_correlation(sensor1, lags:int=10, plot:bool=False):
         """
         The function `auto_correlation` calculates and optionally plots the autocorrelation of a given data
-        array up to a specified number of lags.
+        array up to a specified number of lags. It is computed through the FFT in O(n log n).
         
-        :param data: The `data` parameter is expected to be a NumPy array containing the data for which you
-        want to calculate the auto-correlation
-        :type data: np.array
+        :param sensor1: a sensor (detrended first, as before), a list of sensors, or a 1-D array or 2-D array
+        with one series per column, such as model residuals (only the mean is removed)
         :param lags: The `lags` parameter in the `auto_correlation` function specifies the number of lags to
-        be considered when calculating the autocorrelation. It determines how many lagged values of the data
-        will be used to compute the autocorrelation values, defaults to 10
+        be considered when calculating the autocorrelation, defaults to 10
         :type lags: int (optional)
         :param plot: The `plot` parameter in the `auto_correlation` function is a boolean parameter that
-        determines whether an autocorrelation plot should be displayed or not. If `plot=True`, the function
-        will generate and display the autocorrelation plot using the provided data and specified number of
-        lags. If `, defaults to False
+        determines whether an autocorrelation plot should be displayed or not, defaults to False
         :type plot: bool (optional)
-        :return: The function `auto_correlation` is currently set to return a `NotImplementedError` when the
-        `plot` parameter is set to `False`.
+        :return: the autocorrelation at lags 0 to `lags`: a 1-D array for one series, or a `(lags + 1, series)`
+        array for a batch
         """
-        data = SignalProcessing.detrend(sensor1)
+        acf = SignalProcessing.__batch(sensor1, lambda data: SignalProcessing.__acf(data, lags))
         
         if plot:
             # Adding plot title.
@@ -148,14 +201,98 @@ class SignalProcessing:
             # Providing x-axis name.
             plt.xlabel("Lags") 
             # Plotting the Autocorrelation plot.
-            plt.acorr(data, maxlags = lags, normed=True)
+            plt.vlines(np.arange(len(acf)), 0, acf)
             # Displaying the plot.
             plt.grid(True)
             plt.show()
         
         else:
-            #TODO: output the auto correlation as np array
-            return NotImplementedError
+            return acf
+
+    @staticmethod
+    def partial_auto_correlation(sensor1, lags:int=10):
+        """
+        The partial autocorrelation at lags 0 to `lags`, from the FFT autocorrelation by the Durbin-Levinson
+        recursion, which runs over the lags for all series in a batch at once.
+
+        :param sensor1: anything accepted by `auto_correlation`
+        :param lags: number of lags
+        :return: a 1-D array for one series, or a `(lags + 1, series)` array for a batch
+        """
+        def pacf(data):
+            acf = SignalProcessing.__acf(data, lags)
+            out = np.empty_like(acf)
+            out[0] = 1.0
+            phi = np.zeros((acf.shape[1], 0))# AR coefficients of the current order, one row per series
+            for m in range(1, acf.shape[0]):
+                rho = acf[1:m].T
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    a = (acf[m] - np.sum(phi * rho[:, ::-1], axis=1)) / (1 - np.sum(phi * rho, axis=1))
+                phi = np.column_stack([phi - a[:, None] * phi[:, ::-1], a])
+                out[m] = a
+            return out
+
+        return SignalProcessing.__batch(sensor1, pacf)
+
+    @staticmethod
+    def ljung_box(sensor1, lags:int=10, model_df:int=0) -> dict:
+        """
+        The Ljung-Box test of whether a series (typically model residuals) is white noise, i.e. has no
+        significant autocorrelation up to `lags`.
+
+        :param sensor1: anything accepted by `auto_correlation`
+        :param lags: number of lags tested, at most one less than the length of the shortest series
+        :param model_df: degrees of freedom used by the model, subtracted from `lags`
+        :return: a dict with the 'Test Statistic' and 'p-value' (floats for one series, arrays for a batch);
+        a small p-value means the series is not white
+        :raises ValueError: if fewer than one lag can be tested
+        """
+        n = SignalProcessing.__batch(sensor1, lambda data: np.full((1, data.shape[1]), data.shape[0], dtype=np.float64))[0]# length of each series
+        lags = min(int(lags), int(np.min(n)) - 1)# the autocorrelation only reaches lag n - 1
+        if lags < 1:
+            raise ValueError("The Ljung-Box test needs at least one lag and two samples per series")
+        acf = SignalProcessing.auto_correlation(sensor1, lags=lags)
+        k = np.arange(1, acf.shape[0]).reshape((-1,) + (1,) * (acf.ndim - 1))
+        statistic = n * (n + 2) * np.sum(acf[1:] ** 2 / (n - k), axis=0)
+        p_value = stats.chi2.sf(statistic, max(lags - model_df, 1))
+        if acf.ndim == 1:
+            statistic, p_value = float(statistic), float(p_value)
+        return {
+            'Test Statistic': statistic,
+            'p-value': p_value,
+        }
+
+    @staticmethod
+    def __acf(data:np.ndarray, lags:int) -> np.ndarray:
+        """
+        Autocorrelation of each column of `data` at lags 0 to `lags`, normalised by the length (the biased
+        estimate, as statsmodels uses), from one batched FFT.
+        """
+        n = data.shape[0]
+        centred = data - data.mean(axis=0)
+        nfft = fft.next_fast_len(2 * n - 1, real=True)
+        spectra = fft.rfft(centred, n=nfft, axis=0)
+        autocovariance = fft.irfft(spectra * np.conj(spectra), n=nfft, axis=0)[:min(lags, n - 1) + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return autocovariance / autocovariance[0]
+
+    @staticmethod
+    def __batch(data, function):
+        """
+        Apply `function`, which maps a `(samples, series)` array to a `(rows, series)` array, to a sensor,
+        a list of sensors or an array, returning a 1-D result for a single series. Sensors are detrended as
+        in `detrend`; sensors of different lengths are processed one at a time.
+        """
+        if isinstance(data, (list, tuple)) and data and not np.isscalar(data[0]):
+            if hasattr(data[0], 'get_timeseries'):
+                return np.column_stack([SignalProcessing.__batch(element, function) for element in data])
+            data = np.column_stack(data)
+        elif hasattr(data, 'get_timeseries'):
+            data = SignalProcessing.detrend(data)
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            return function(data[:, None])[:, 0]
+        return function(data)
 
     @staticmethod
     def cross_correlation(sensor1:object, sensor2:object, lags_percentage: int = 75, plot: bool = False):
@@ -188,26 +325,84 @@ class SignalProcessing:
         if lags_percentage>=100:
             raise ValueError('Lags cannot be greater than or equal to 100%')
         
-        signals = SignalProcessing.align_timeseries([sensor1, sensor2], numpy=True)# get a numpy array of the two signals
-        signals = signals[:, 1:]# get rid of the first column which is time
+        _, signals = SignalProcessing.align([sensor1, sensor2])# get a numpy array of the two signals
         
         # Dynamically determine the number of lags
         lags = int(signals.shape[0] * lags_percentage/100) # get the number of rows (samples) and find 75% of the lags
 
+        # computed by FFT in O(n log n), np.correlate is O(n^2) and never finishes on months of data
+        cross_corr = SignalProcessing.__normalised_correlation(signals, lags)[0, 1]
+
         if plot:
             plt.title("Cross-correlation Plot")
             plt.xlabel("Lags")
-            plt.xcorr(signals[:, 0], signals[:, 1], maxlags=lags, normed=True)
+            plt.vlines(np.arange(-lags, lags + 1), 0, cross_corr)
+            plt.axhline(0, color='black', linewidth=0.5)
             plt.grid(True)
             plt.show()
         else:
-            # Calculating cross-correlation
-            cross_corr = np.correlate(signals[:, 0] - np.mean(signals[:, 0]), signals[:, 1] - np.mean(signals[:, 1]), mode='full')
-            # Normalizing the cross-correlation
-            cross_corr = cross_corr / (np.std(signals[:, 0]) * np.std(signals[:, 1]) * len(signals[:, 1]))
             # Returning the central part of the cross-correlation
-            mid = len(cross_corr) // 2
-            return cross_corr[mid - lags: mid + lags + 1]
+            return cross_corr
+
+    @staticmethod
+    def cross_correlation_matrix(sensors:list, max_lag:int):
+        """
+        The normalised cross-correlation of every pair of sensors for lags `-max_lag` to `max_lag`, from
+        one batched FFT of all the aligned signals. Used to pick the lags for identification across many
+        sensor pairs.
+
+        :param sensors: list of sensors, aligned onto a common grid first
+        :param max_lag: largest lag in samples of the aligned grid
+        :return: an array of shape `(len(sensors), len(sensors), 2 * max_lag + 1)` where `[i, j, max_lag + k]`
+            correlates sensor i at time t + k with sensor j at time t, as `cross_correlation(i, j)` does
+        """
+        _, signals = SignalProcessing.align(sensors)
+        return SignalProcessing.__normalised_correlation(signals, max_lag)
+
+    @staticmethod
+    def __normalised_correlation(signals:np.ndarray, max_lag:int) -> np.ndarray:
+        """
+        Cross-correlate every pair of columns of `signals` for lags `-max_lag` to `max_lag`, normalised by
+        the standard deviations and the length like `plt.xcorr(normed=True)`. The forward FFT of all the
+        columns is taken once; the inverse transforms are batched one row of the matrix at a time so memory
+        stays at O(n * channels).
+        """
+        n, channels = signals.shape
+        max_lag = min(int(max_lag), n - 1)
+        centred = signals - signals.mean(axis=0)
+        std = centred.std(axis=0)
+        std[std == 0] = np.inf# constant signals correlate with nothing
+        nfft = fft.next_fast_len(2 * n - 1, real=True)# zero-padded so the circular correlation equals the linear one
+        spectra = fft.rfft(centred / std, n=nfft, axis=0)
+
+        lags = np.r_[np.arange(nfft - max_lag, nfft), np.arange(max_lag + 1)]# negative lags wrap to the end
+        out = np.empty((channels, channels, 2 * max_lag + 1))
+        for i in range(channels):
+            correlation = fft.irfft(spectra[:, i:i + 1] * np.conj(spectra), n=nfft, axis=0)
+            out[i] = correlation[lags].T / n
+        return out
+
+    @staticmethod
+    def align(data:list, earliest_time=None, method:str='linear', dtype=np.float64):
+        """
+        Align the samples of several sensors onto one regular grid spaced at the smallest of their
+        timesteps, over the period all of them cover. This is the array form of `align_timeseries`, used
+        by the analysis and identification code.
+
+        :param data: list of sensors
+        :param earliest_time: optional earliest time of the grid
+        :param method: 'linear' interpolates between samples, 'zoh' holds the most recent sample
+        :param dtype: dtype of the aligned values
+        :return: a `(grid, values)` tuple: int64 UTC nanoseconds and a 2-D array with one column per sensor
+        """
+        channels = [element.get_arrays() for element in data] # raw time/value arrays, no DataFrames
+        timesteps = []
+        for element in data:
+            try:
+                timesteps.append(element.get_timestep()) # cached on each sensor
+            except ValueError:# too few samples to have a timestep, the others set the grid
+                continue
+        return align(channels, interval=min(timesteps) if timesteps else None, method=method, start=earliest_time, dtype=dtype)
 
     @staticmethod
     def align_timeseries(data:list, earliest_time=None, numpy=False):
@@ -235,30 +430,10 @@ class SignalProcessing:
         DataFrame.
         """
 
-        dataframes_list = [element.get_timeseries() for element in data] # now we get a list of python dataframes
-        timestep_list = [element.get_timestep() for element in data] # get the sampling time for all 
-        min_timestep = min(timestep_list) # get the smallest timestep to resample from
-
-        sample_time = f'{min_timestep}S'
-
-        #find the most recent first entry within the time series
-        first_entries = [df.iloc[0] for df in dataframes_list]
-        most_recent_first_entry = max(first_entries, key=lambda x: x['time']) #TODO: might still be max or min not sure
-
-        last_entries = [df.iloc[-1] for df in dataframes_list]
-        final_entry = max(last_entries, key=lambda x: x['time'])
-
-        aligned_dataframes = [df[df.index >= most_recent_first_entry.name] for df in dataframes_list]# aligned to the start
-        trimmed_dataframes = [df[df.index <= final_entry.name] for df in aligned_dataframes]# cut off at the end
-
-        # Ensure the 'time' column is a datetime index
-        for i in range(len(trimmed_dataframes)):
-            trimmed_dataframes[i]['time'] = pd.to_datetime(trimmed_dataframes[i]['time'])
-            trimmed_dataframes[i].set_index('time', inplace=True)
-
-        resampled_dataframes = [df.resample(sample_time).interpolate() for df in trimmed_dataframes]# resampled with the same sampling frequency
-
-        combined_df = pd.concat(resampled_dataframes, axis=1, join='inner') # turn into one dataframe 
+        grid, values = SignalProcessing.align(data, earliest_time=earliest_time)
+        columns = [getattr(element, 'identifier', None) or f'state_{i}' for i, element in enumerate(data)]
+        index = pd.DatetimeIndex(grid.view('datetime64[ns]'), name='time').tz_localize('UTC')
+        combined_df = pd.DataFrame(values, index=index, columns=columns, copy=False) # one dataframe over the aligned array
 
         if numpy:
             combined_df.reset_index(inplace=True)# make the time index a column that isn't an index
@@ -286,10 +461,10 @@ class SignalProcessing:
 
     @staticmethod
     def detrend(sensor1:object, plot:bool = False):
-        data = sensor1.get_timeseries(numpy=True)
+        detrended_data = SignalProcessing.__cached(sensor1, 'detrend', lambda: signal.detrend(sensor1.get_timeseries(numpy=True)))
         
         if plot:
-            detrended_data = SignalProcessing.detrend(sensor1)
+            data = sensor1.get_timeseries(numpy=True)
             plt.figure(figsize=(10, 6))
 
             plt.subplot(2, 1, 1)
@@ -305,28 +480,30 @@ class SignalProcessing:
             plt.tight_layout()
             plt.show()
         else:
-            return signal.detrend(data)
+            return detrended_data
     
     @staticmethod
     def fourier_transform(sensor1:object, plot: bool = False):
 
-        # Detrend the data
-        data_detrend = SignalProcessing.detrend(sensor1)
-        timestep = sensor1.get_timestep()
-        # Perform FFT
-        FFT = np.fft.fft(data_detrend)
+        def compute():
+            # Detrend the data
+            data_detrend = SignalProcessing.detrend(sensor1)
+            timestep = sensor1.get_timestep()
+            # Perform FFT, the input is real so only the non-negative half is computed
+            FFT = np.fft.rfft(data_detrend)
 
-        # Get frequency components
-        n = len(data_detrend)
-        freq = np.fft.fftfreq(n, d=timestep)
+            # Get frequency components
+            n = len(data_detrend)
+            freq = np.fft.rfftfreq(n, d=timestep)
 
-        # Normalize the FFT output
-        FFT_abs = np.abs(FFT) / n
+            # Normalize the FFT output
+            FFT_abs = np.abs(FFT) / n
 
-        # Only keep the positive frequencies
-        mask = freq > 0
-        freq = freq[mask]
-        FFT_abs = FFT_abs[mask]
+            # Only keep the positive frequencies, below Nyquist as with the full FFT
+            positive = slice(1, (n + 1) // 2)
+            return freq[positive], FFT_abs[positive]
+
+        freq, FFT_abs = SignalProcessing.__cached(sensor1, 'fft', compute)
 
         if plot:
             plt.figure(figsize=(10, 6))
@@ -345,8 +522,25 @@ class SignalProcessing:
     
 
     @staticmethod
-    def filter_data(frequency_low:float, frequency_high:float, plot:bool=False) -> pd.DataFrame:
-        pass
+    def filter_data(sensor1:object, frequency_low:float=None, frequency_high:float=None, order:int=5, plot:bool=False) -> pd.DataFrame:
+        """
+        Keep the frequencies of the sensor data between `frequency_low` and `frequency_high` Hz: a band-pass
+        filter if both are given, a high-pass filter for only `frequency_low` and a low-pass filter for only
+        `frequency_high`. The filter is zero-phase and applied to the detrended data.
+
+        :return: a DataFrame with the `time` and filtered `state` of every sample, or None if `plot` is True
+        """
+        if frequency_low is not None and frequency_high is not None:
+            filtered = SignalProcessing.butter_bandpass_filter(sensor1, frequency_low, frequency_high, order, plot)
+        elif frequency_low is not None:
+            filtered = SignalProcessing.butter_highpass_filter(sensor1, frequency_low, order, plot)
+        elif frequency_high is not None:
+            filtered = SignalProcessing.butter_lowpass_filter(sensor1, frequency_high, order, plot)
+        else:
+            raise ValueError('At least one of frequency_low and frequency_high is needed')
+
+        if not plot:
+            return pd.DataFrame({'time': sensor1.timeseries['time'], 'state': filtered})
 
     @staticmethod
     def __plot():
@@ -30,17 +30,18 @@ class SystemIdentification:
         #TODO: need to realign the inputs and outputs - Done
         #TODO: need to split into training and testing - Done
         #TODO: need to validate sysid feasibility via dsp by finding the stationarity value (stationarity)
-        #TODO: analyse the residulas, which should resemble white noise.
-        #TODO: need to check the autocorrelation function of the residuals to ensure no significant correlation remains.
+        #TODO: analyse the residulas, which should resemble white noise. - Done, see check_residuals
+        #TODO: need to check the autocorrelation function of the residuals to ensure no significant correlation remains. - Done
 
         np.random.seed(42)
         self.model = None
+        self.residuals = None
+        self.residual_test = None# Ljung-Box result of the last fit
         self.MinMaxScaler = MinMaxScaler()
 
         self.combined_list = input_sensors + output_sensors#combine the list of inputs and output sensors
 
-        self.aligned_data = dsp.align_timeseries(self.combined_list, numpy=True)
-        self.aligned_data = self.aligned_data[:, 1:]#get rid of the time column
+        _, self.aligned_data = dsp.align(self.combined_list)# one 2-D float array, one column per sensor
         self.aligned_data_normalized = self.MinMaxScaler.fit_transform(self.aligned_data)
 
         ### Get a sample of the data
@@ -132,6 +133,33 @@ class SystemIdentification:
 
             self.model.fit(X, t=1)
             self.model.print()
+            self.check_residuals(X)
+
+    def check_residuals(self, X, lags:int = 10, significance:float = 0.05) -> dict:
+        """
+        Test whether the residuals of the fitted model resemble white noise. The residuals are the
+        differences between the measured derivatives and the model's predictions; any autocorrelation
+        left in them is dynamics the model has not captured.
+
+        :param X: the data the model was fitted on
+        :param lags: number of lags in the Ljung-Box test
+        :param significance: p-values below this flag a feature whose residuals are not white
+        :return: the Ljung-Box 'Test Statistic' and 'p-value' arrays, one entry per feature, also kept
+            in `self.residual_test`; None if there are too few residuals to test
+        """
+        self.residuals = self.model.differentiation_method(X, t=1) - self.model.predict(X)
+        self.residuals = self.residuals[np.isfinite(self.residuals).all(axis=1)]# finite differences can leave NaN edges
+        lags = min(lags, len(self.residuals) // 5)# a lag per five samples at most, or the estimates are too noisy
+        if lags < 1:
+            print(f"Only {len(self.residuals)} residuals, too few for the Ljung-Box test")
+            self.residual_test = None
+            return None
+        self.residual_test = dsp.ljung_box(self.residuals, lags=lags)
+
+        not_white = np.flatnonzero(np.asarray(self.residual_test['p-value']) < significance)
+        if not_white.size:
+            print(f"Residuals of features {not_white.tolist()} are autocorrelated (Ljung-Box p < {significance}), the model may be missing dynamics")
+        return self.residual_test
 
 
     def predict(self, input_data_data):
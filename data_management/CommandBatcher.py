@@ -0,0 +1,89 @@
+"""
+The `CommandBatcher` class collects the service calls a controller issues to its actuators during one
+control tick and sends them to HAOS together.
+"""
+import asyncio
+import logging
+import time
+
+
+class CommandBatcher:
+    # the state an entity is left in by each service, for services where it is known
+    TARGET_STATES = {"turn_on": "on", "turn_off": "off"}
+
+    def __init__(self, datamanager, timeout: float = 10) -> None:
+        """
+        Create a batcher sending commands through `datamanager`, a connected `SensorDataManager`.
+
+        :param timeout: seconds each call may take before it is abandoned and reported as failed
+        """
+        self.datamanager = datamanager
+        self.timeout: float = timeout
+        self.pending: dict = {}# entity_id -> (service, service_data, target state) to send on the next flush
+        self.last_commanded: dict = {}# entity_id -> state the last successful command left it in
+        self._commanded_at: dict = {}# entity_id -> epoch seconds at which that command was sent
+
+    def queue(self, entity_id: str, service: str, service_data: dict = None, state: str = None) -> None:
+        """
+        Queue `service` for `entity_id` until the next `flush`. A later command to the same entity in the
+        same tick replaces the earlier one, since only the last would have any lasting effect.
+
+        :param state: the state the command leaves the entity in; inferred for `turn_on` and `turn_off`.
+            Commands with a known target state are skipped if the entity is already in it.
+        """
+        if state is None:
+            state = self.TARGET_STATES.get(service)
+        self.pending[entity_id] = (service, service_data, state)
+
+    def last_known_state(self, entity_id: str):
+        """
+        The state the last successful command left the entity in, until the datamanager's state mirror (if
+        it is running) reports an update made after that command; from then on the mirrored state. The
+        mirror lags a command until HAOS' `state_changed` event arrives, so trusting it straight away would
+        drop a quick reversal as a no-op. None if neither is known.
+        """
+        entity = self.datamanager.states.get(entity_id) if self.datamanager.mirroring else None
+        commanded = self.last_commanded.get(entity_id)
+        if entity is not None and (commanded is None or (entity.last_updated or 0) > self._commanded_at[entity_id]):
+            return entity.state
+        return commanded
+
+    async def flush(self) -> dict:
+        """
+        Send every queued command concurrently, each with its own timeout, and wait for them all.
+
+        :return: maps each queued entity_id to the result of its call, None if it was skipped because the
+            entity was already in the target state, or the Exception if the call failed or timed out
+        """
+        commands, self.pending = self.pending, {}
+        results = {}
+        calls = {}
+        for entity_id, (service, service_data, state) in commands.items():
+            if state is not None and state == self.last_known_state(entity_id):
+                results[entity_id] = None
+                continue
+            calls[entity_id] = self.__call(entity_id, service, service_data, state)
+
+        replies = await asyncio.gather(*calls.values(), return_exceptions=True)
+        for entity_id, reply in zip(calls, replies):
+            if isinstance(reply, Exception):
+                logging.warning(f"Command to {entity_id} failed: {reply!r}")
+            results[entity_id] = reply
+        return results
+
+    async def __call(self, entity_id: str, service: str, service_data, state):
+        domain = entity_id.split(".", 1)[0]
+        sent_at = time.time()
+        try:
+            reply = await asyncio.wait_for(
+                self.datamanager.call_service(domain, service, service_data, target={"entity_id": entity_id}),
+                self.timeout,
+            )
+        except BaseException:
+            self.last_commanded.pop(entity_id, None)# the outcome is unknown, so don't skip the next command
+            self._commanded_at.pop(entity_id, None)
+            raise
+        if state is not None:
+            self.last_commanded[entity_id] = state
+            self._commanded_at[entity_id] = sent_at
+        return reply
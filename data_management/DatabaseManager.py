@@ -2,17 +2,27 @@
 The `DatabaseManager` class in Python initializes a database engine with given credentials,
 retrieves database tables, and fetches time-series data for a specific sensor entity.
 """
-from sqlalchemy import create_engine, Table, MetaData, URL
+from sqlalchemy import create_engine, Table, MetaData, URL, BigInteger, Float, Text, and_, any_, bindparam, case, cast, func, literal_column, or_
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql import table, column, select
 from sqlalchemy.exc import SQLAlchemyError
+import numpy as np
 import pandas as pd
 
+from data_management.TimeseriesCache import TimeseriesCache
+from data_management.resampling import estimate_interval, resample
+
+
+NUMERIC_STATE_PATTERN = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'# states that postgres can safely cast to float
+BUCKET_AGGREGATES = ('avg', 'min', 'max', 'first', 'last')# aggregates that can be pushed into a time_bucket query
+
 
 class DatabaseManager:
-    def __init__(self, credentials:dict) -> None:  
+    def __init__(self, credentials:dict, cache_dir: str=None) -> None:  
 
         """
-        Init with database credentials and create the database engine
+        Init with database credentials and create the database engine. If `cache_dir` is given, entity
+        histories fetched as arrays are cached there and only new samples are requested on later calls.
         """
 
         self.__credentials = credentials
@@ -26,7 +36,9 @@ class DatabaseManager:
             )
         
         self.engine = self.connect_to_database()
+        self.async_engine = None# created on first use, see connect_to_database_async
         self.ltss_table = self.get_database_table('ltss')#default hypertable for homeassistant ltss addon
+        self.cache = TimeseriesCache(cache_dir) if cache_dir else None
         
     def connect_to_database(self):
         """
@@ -37,12 +49,53 @@ class DatabaseManager:
         print an error message and return `None`.
         """
         try:
-            engine = create_engine(self.url_object)
+            engine = create_engine(self.url_object, **self._engine_options())
             return engine
         except SQLAlchemyError as e:
             print(f"Error connecting to the database: {e}")
             return None
 
+    def connect_to_database_async(self):
+        """
+        The function `connect_to_database_async` creates the asyncpg based SQLAlchemy engine used by the
+        `*_async` methods, with the same pool configuration as the synchronous engine.
+        :return: The async engine, which is also stored on `self.async_engine`. If asyncpg is not installed
+        or the engine cannot be created, an error message is printed and `None` is returned.
+        """
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self.async_engine = create_async_engine(self.url_object.set(drivername="postgresql+asyncpg"), **self._engine_options())
+            return self.async_engine
+        except (SQLAlchemyError, ImportError) as e:
+            print(f"Error connecting to the database asynchronously: {e}")
+            return None
+
+    async def close_async(self) -> None:
+        """
+        Dispose of the async engine's connection pool, if it was created.
+        """
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+            self.async_engine = None
+
+    def _engine_options(self) -> dict:
+        """
+        Connection pool options taken from the optional `db_pool_size`, `db_max_overflow`,
+        `db_pool_timeout`, `db_pool_recycle` and `db_pool_pre_ping` credentials. Values may be strings,
+        as read from a .env file; options that are not set keep SQLAlchemy's defaults.
+        """
+        options = {}
+        for key, option in (('db_pool_size', 'pool_size'), ('db_max_overflow', 'max_overflow'),
+                            ('db_pool_timeout', 'pool_timeout'), ('db_pool_recycle', 'pool_recycle')):
+            value = self.__credentials.get(key)
+            if value is not None and value != '':
+                options[option] = int(value)
+
+        pre_ping = self.__credentials.get('db_pool_pre_ping')
+        if pre_ping is not None and pre_ping != '':
+            options['pool_pre_ping'] = str(pre_ping).strip().lower() in ('1', 'true', 'yes', 'on')
+        return options
+
     def get_database_table(self, table: str):
         """
         The function `get_database_table` retrieves the SQLAlchemy Table object representing a specific
@@ -62,67 +115,542 @@ class DatabaseManager:
             print(f"Error fetching table {table}: {e}")
             return None
             
-    def get_timeseries(self, sensor: str, table: str='ltss') -> pd.DataFrame:
+    def get_timeseries(self, sensor: str, table: str='ltss', start=None, end=None, bucket=None, aggregate: str='avg', resample: str='zoh', interval=None) -> pd.DataFrame:
             """
             Retrieve time-series data for a specific sensor (entity) and return as a Pandas DataFrame.
 
+            When `bucket` is given the aggregation is pushed into the database with TimescaleDB's
+            `time_bucket`, so only one row per bucket is transferred instead of the raw history.
+
+            Unbucketed queries are served from the cache when the manager has one, so only samples newer
+            than the last cached one are fetched. The cache holds numeric states, so the `state` column is
+            then float, with 'on'/'off' as 1.0/0.0 and other non-numeric states as NaN.
+
             Args:
                 table (str): The name of the table containing time-series data.
                 sensor (str): The entity_id of the specific sensor to query.
+                start: Optional inclusive lower bound on the sample time (datetime, Timestamp or string).
+                end: Optional exclusive upper bound on the sample time (datetime, Timestamp or string).
+                bucket: Optional bucket width (Timedelta, timedelta or string such as '5min').
+                aggregate (str): Aggregate used per bucket, one of 'avg', 'min', 'max', 'first' or 'last'.
+                resample (str): How unbucketed samples are put on a regular grid: 'zoh', 'mean', 'last'
+                    (see `_resample_timeseries`) or None to return the raw samples.
+                interval: Grid spacing used by `resample`; estimated from the samples if None.
 
             Returns:
                 pd.DataFrame: A DataFrame containing the time-series data for the given sensor.
             """
 
+            if self.cache is not None and bucket is None:
+                times, states = self.get_timeseries_arrays(sensor, start=start, end=end, dropna=False)
+                df = pd.DataFrame({'time': pd.to_datetime(times, utc=True), 'state': np.array(states)})# copied out of the memory map
+                return self._timeseries_frame(df, bucket, resample, interval)
+
             table_obj = self.ltss_table
             if table_obj is None:
                 return pd.DataFrame()  # Return an empty DataFrame if the table doesn't exist
 
-            # Create a query to filter by entity_id
-            stmt = select(table_obj).where(table_obj.c.entity_id == sensor).order_by(table_obj.c.time)
+            stmt = self._timeseries_statement(table_obj, sensor, start, end, bucket, aggregate)
 
             # Execute the query and convert to a Pandas DataFrame
             with self.engine.connect() as connection:
                 result = connection.execute(stmt)
                 data = result.fetchall()
                 df = pd.DataFrame(data, columns=result.keys())
-                df = df.drop(["entity_id"], axis=1)# drop the entity id since we've asked for it in the method call
-                df['time'] = pd.to_datetime(df['time'])# make time a datetime var
-                df.set_index('time', inplace=True)#make time the index
 
-                df = self._resample_timeseries(df)
+            return self._timeseries_frame(df, bucket, resample, interval)
+
+    async def get_timeseries_async(self, sensor: str, start=None, end=None, bucket=None, aggregate: str='avg', resample: str='zoh', interval=None) -> pd.DataFrame:
+            """
+            Async variant of `get_timeseries` running on the asyncpg engine, so that database loads can
+            overlap with websocket traffic in the same event loop.
+
+            Args:
+                sensor (str): The entity_id of the specific sensor to query.
+                start: Optional inclusive lower bound on the sample time.
+                end: Optional exclusive upper bound on the sample time.
+                bucket: Optional bucket width for server-side aggregation.
+                aggregate (str): Aggregate used per bucket, one of 'avg', 'min', 'max', 'first' or 'last'.
+                resample (str): How unbucketed samples are put on a regular grid: 'zoh', 'mean', 'last'
+                    (see `_resample_timeseries`) or None to return the raw samples.
+                interval: Grid spacing used by `resample`; estimated from the samples if None.
+
+            Returns:
+                pd.DataFrame: A DataFrame containing the time-series data for the given sensor.
+            """
+            table_obj = self.ltss_table
+            async_engine = self.async_engine or self.connect_to_database_async()
+            if table_obj is None or async_engine is None:
+                return pd.DataFrame()
+
+            stmt = self._timeseries_statement(table_obj, sensor, start, end, bucket, aggregate)
+
+            async with async_engine.connect() as connection:
+                result = await connection.execute(stmt)
+                df = pd.DataFrame(result.fetchall(), columns=result.keys())
+
+            return self._timeseries_frame(df, bucket, resample, interval)
+
+    def _timeseries_statement(self, table_obj, sensor: str, start, end, bucket, aggregate: str):
+        """
+        Build the query behind `get_timeseries`: the raw time and state of `sensor`, or, when `bucket` is
+        given, one aggregated row per bucket computed in the database with TimescaleDB's `time_bucket`.
+        """
+        if bucket is None:
+            # Attributes are fetched separately via get_attributes
+            stmt = select(table_obj.c.time, table_obj.c.state).where(table_obj.c.entity_id == sensor)
+            return self._filter_time_window(stmt, table_obj.c.time, start, end).order_by(table_obj.c.time)
+
+        if aggregate not in BUCKET_AGGREGATES:
+            raise ValueError(f"aggregate must be one of {BUCKET_AGGREGATES}, got '{aggregate}'")
+
+        bucket = pd.Timedelta(bucket)
+        if bucket <= pd.Timedelta(0):
+            raise ValueError("bucket must be a positive time interval")
+
+        interval = literal_column(f"INTERVAL '{bucket.total_seconds()} seconds'")# inlined so GROUP BY matches the SELECT expression
+        time_bucket = func.time_bucket(interval, table_obj.c.time).label('time')
+        if aggregate in ('first', 'last'):
+            state_agg = getattr(func, aggregate)(table_obj.c.state, table_obj.c.time)# timescale first/last keep the raw state, ordered by time
+        else:
+            state_agg = getattr(func, aggregate)(self._numeric_state(table_obj))
+
+        stmt = (
+            select(time_bucket, state_agg.label('state'))
+            .where(table_obj.c.entity_id == sensor)
+        )
+        return self._filter_time_window(stmt, table_obj.c.time, start, end).group_by(time_bucket).order_by(time_bucket)
+
+    def _timeseries_frame(self, df: pd.DataFrame, bucket=None, resample: str='zoh', interval=None) -> pd.DataFrame:
+        """
+        Index a fetched time/state frame by time and put it on a regular grid: bucketed results only need
+        their empty buckets forward filled, raw results are resampled with `resample` unless it is None.
+        """
+        df['time'] = pd.to_datetime(df['time'])# make time a datetime var
+        df.set_index('time', inplace=True)#make time the index
+
+        if bucket is None:
+            return self._resample_timeseries(df, resample, interval) if resample is not None else df
+        if len(df) > 1:
+            df = df.asfreq(pd.Timedelta(bucket)).ffill()# fill buckets in which the sensor reported nothing
+        return df
+
+    @staticmethod
+    def _numeric_state(table_obj):
+        """
+        The ltss `state` column is text. Cast it to float inside the database, mapping 'on'/'off' to 1/0
+        and anything else that is not a number (e.g. 'unavailable') to NULL so that aggregates ignore it
+        instead of failing.
+        """
+        return case(
+            (table_obj.c.state.op('~')(NUMERIC_STATE_PATTERN), cast(table_obj.c.state, Float)),
+            (table_obj.c.state == 'on', 1.0),# switches and binary sensors
+            (table_obj.c.state == 'off', 0.0),
+            else_=None,
+        )
+
+    @classmethod
+    def _filter_time_window(cls, stmt, time_column, start=None, end=None):
+        """
+        Restrict `stmt` to samples with `start <= time < end`. Either bound may be None; naive bounds are
+        taken as UTC, as in `_to_nanoseconds`, rather than in the database session's time zone.
+        """
+        if start is not None:
+            stmt = stmt.where(time_column >= cls._to_utc(start).to_pydatetime())
+        if end is not None:
+            stmt = stmt.where(time_column < cls._to_utc(end).to_pydatetime())
+        return stmt
+
+    def get_attributes(self, sensor: str) -> dict:
+        """
+        Retrieve the most recent non-null attributes of a specific sensor (entity).
+
+        Args:
+            sensor (str): The entity_id of the specific sensor to query.
+
+        Returns:
+            dict: The attributes recorded with the latest sample, or an empty dict if there are none.
+        """
+        table_obj = self.ltss_table
+        if table_obj is None:
+            return {}
+
+        stmt = (
+            select(table_obj.c.attributes)
+            .where(table_obj.c.entity_id == sensor, table_obj.c.attributes.isnot(None))
+            .order_by(table_obj.c.time.desc())
+            .limit(1)
+        )
+        with self.engine.connect() as connection:
+            attributes = connection.execute(stmt).scalar()
+        return attributes or {}
+
+    def get_attributes_many(self, entity_ids: list) -> dict:
+        """
+        Retrieve the most recent non-null attributes of several entities in one `DISTINCT ON` query.
+
+        Args:
+            entity_ids (list): The entity_ids to query.
+
+        Returns:
+            dict: Maps every requested entity_id to its latest attributes (an empty dict if there are none).
+        """
+        entity_ids = list(dict.fromkeys(entity_ids))
+        attributes = {entity_id: {} for entity_id in entity_ids}
+
+        table_obj = self.ltss_table
+        if table_obj is None or not entity_ids:
+            return attributes
+
+        ids = bindparam('entity_ids', value=entity_ids, type_=ARRAY(Text))
+        stmt = (
+            select(table_obj.c.entity_id, table_obj.c.attributes)
+            .distinct(table_obj.c.entity_id)
+            .where(table_obj.c.entity_id == any_(ids), table_obj.c.attributes.isnot(None))
+            .order_by(table_obj.c.entity_id, table_obj.c.time.desc())
+        )
+        with self.engine.connect() as connection:
+            for entity_id, entity_attributes in connection.execute(stmt):
+                attributes[entity_id] = entity_attributes
+        return attributes
+
+    def get_attribute_history(self, sensor: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Retrieve only the distinct versions of a sensor's attributes together with the time each version
+        first appeared, instead of one copy of the attributes per sample.
+
+        Args:
+            sensor (str): The entity_id of the specific sensor to query.
+            start: Optional inclusive lower bound on the sample time.
+            end: Optional exclusive upper bound on the sample time.
+
+        Returns:
+            pd.DataFrame: A DataFrame indexed by `time` with an `attributes` column, one row per change.
+        """
+        table_obj = self.ltss_table
+        if table_obj is None:
+            return pd.DataFrame()
+
+        previous = func.lag(table_obj.c.attributes).over(order_by=table_obj.c.time).label('previous')
+        versions = select(table_obj.c.time, table_obj.c.attributes, previous).where(table_obj.c.entity_id == sensor)
+        versions = self._filter_time_window(versions, table_obj.c.time, start, end).subquery()
+
+        stmt = (
+            select(versions.c.time, versions.c.attributes)
+            .where(versions.c.attributes.is_distinct_from(versions.c.previous))
+            .order_by(versions.c.time)
+        )
+        with self.engine.connect() as connection:
+            result = connection.execute(stmt)
+            df = pd.DataFrame(result.fetchall(), columns=result.keys())
+
+        df['time'] = pd.to_datetime(df['time'])
+        df.set_index('time', inplace=True)
+        return df
 
-            return df
+    def get_state_changes(self, entity_ids: list, start=None, end=None) -> list:
+        """
+        Retrieve the raw recorded states of several entities in time order, as used to replay the changes
+        missed while the websocket was disconnected.
+
+        Args:
+            entity_ids (list): The entity_ids to query.
+            start: Optional inclusive lower bound on the sample time.
+            end: Optional exclusive upper bound on the sample time.
+
+        Returns:
+            list: `(entity_id, time, state, attributes)` tuples ordered by time.
+        """
+        entity_ids = list(dict.fromkeys(entity_ids))
+        table_obj = self.ltss_table
+        if table_obj is None or not entity_ids:
+            return []
+
+        ids = bindparam('entity_ids', value=entity_ids, type_=ARRAY(Text))
+        stmt = select(table_obj.c.entity_id, table_obj.c.time, table_obj.c.state, table_obj.c.attributes).where(table_obj.c.entity_id == any_(ids))
+        stmt = self._filter_time_window(stmt, table_obj.c.time, start, end).order_by(table_obj.c.time)
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(stmt)]
+
+    def get_timeseries_arrays(self, sensor: str, start=None, end=None, chunk_size: int=50000, dropna: bool=True):
+        """
+        Stream the history of `sensor` into columnar NumPy arrays.
+
+        Rows are read through a server-side cursor `chunk_size` at a time and copied straight into
+        preallocated buffers, so no per-row Python objects outlive their chunk and peak memory stays
+        proportional to the arrays themselves rather than to the length of the history.
+
+        If the manager has a cache, only samples newer than the last cached one are fetched; they are
+        appended to the cache and the requested window is served from it.
+
+        Args:
+            sensor (str): The entity_id of the specific sensor to query.
+            start: Optional inclusive lower bound on the sample time.
+            end: Optional exclusive upper bound on the sample time.
+            chunk_size (int): Number of rows fetched from the cursor per round-trip.
+            dropna (bool): Drop samples whose state is not numeric (e.g. 'unavailable').
+
+        Returns:
+            tuple: `(times, states)` where `times` is an int64 array of UTC nanoseconds since the epoch
+            (directly viewable as `datetime64[ns]`) and `states` is a float64 array.
+        """
+        if self.cache is not None:
+            self._sync_cache([sensor], end, chunk_size)
+            times, states = self.cache.load(sensor, self._to_nanoseconds(start), self._to_nanoseconds(end))
+        else:
+            times, states = self._stream_arrays(sensor, start, end, chunk_size)
+
+        return self._dropna(times, states) if dropna else (times, states)
+
+    def get_timeseries_many(self, entity_ids: list, start=None, end=None, chunk_size: int=50000, dropna: bool=True, resample: str=None, interval=None) -> dict:
+        """
+        Stream the histories of several entities with a single `entity_id = ANY(...)` query and split
+        the result per entity. Uses the cache in the same way as `get_timeseries_arrays`.
+
+        Args:
+            entity_ids (list): The entity_ids to query.
+            start: Optional inclusive lower bound on the sample time.
+            end: Optional exclusive upper bound on the sample time.
+            chunk_size (int): Number of rows fetched from the cursor per round-trip.
+            dropna (bool): Drop samples whose state is not numeric (e.g. 'unavailable'), after resampling.
+            resample (str): Put each entity on a regular grid as `get_timeseries` does: 'zoh', 'mean' or
+                'last', or None (the default) for the raw samples.
+            interval: Grid spacing used by `resample`; estimated per entity if None.
+
+        Returns:
+            dict: Maps every requested entity_id to a `(times, states)` tuple laid out exactly as the
+            output of `get_timeseries_arrays`. Entities without any rows map to empty arrays.
+        """
+        entity_ids = list(dict.fromkeys(entity_ids))# deduplicate, keep order
+
+        if self.cache is not None:
+            self._sync_cache(entity_ids, end, chunk_size)
+            start_ns, end_ns = self._to_nanoseconds(start), self._to_nanoseconds(end)
+            timeseries = {entity_id: self.cache.load(entity_id, start_ns, end_ns) for entity_id in entity_ids}
+        else:
+            timeseries = self._stream_many(entity_ids, start, end, chunk_size)
+
+        if resample is not None:
+            timeseries = {entity_id: self._resample_arrays(*arrays, resample, interval) for entity_id, arrays in timeseries.items()}
+        if dropna:
+            timeseries = {entity_id: self._dropna(*arrays) for entity_id, arrays in timeseries.items()}
+        return timeseries
+
+    def _sync_cache(self, entity_ids: list, end, chunk_size: int) -> None:
+        """
+        Bring the cached history of `entity_ids` up to date. Entities with nothing cached are fetched in
+        full, the others only after their own last cached sample, so no cached row is downloaded again.
+        Entities whose cache already covers `end` are not queried at all.
+        """
+        end_ns = self._to_nanoseconds(end)
+        uncached = []
+        since = {}# entity_id -> time of its last cached sample
+        for entity_id in entity_ids:
+            last = self.cache.last_time(entity_id)
+            if last is None:
+                uncached.append(entity_id)
+            elif end_ns is None or end_ns > last:
+                since[entity_id] = last
+
+        timeseries = {}
+        if len(uncached) == 1:
+            timeseries[uncached[0]] = self._stream_arrays(uncached[0], None, None, chunk_size)
+        elif uncached:
+            timeseries.update(self._stream_many(uncached, None, None, chunk_size))
+
+        if len(since) == 1:
+            entity_id, last = next(iter(since.items()))
+            timeseries[entity_id] = self._stream_arrays(entity_id, self._after(last), None, chunk_size)
+        elif since:
+            timeseries.update(self._stream_many(list(since), None, None, chunk_size, since=since))
+
+        for entity_id, (times, states) in timeseries.items():
+            self.cache.append(entity_id, times, states)# drops anything at or before that entity's last sample
+
+    def _stream_arrays(self, sensor: str, start, end, chunk_size: int):
+        """
+        Stream one entity into `(times, states)` arrays, keeping non-numeric states as NaN.
+        """
+        table_obj = self.ltss_table
+        if table_obj is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        stmt = select(self._epoch_microseconds(table_obj), self._numeric_state(table_obj)).where(table_obj.c.entity_id == sensor)
+        stmt = self._filter_time_window(stmt, table_obj.c.time, start, end).order_by(table_obj.c.time)
+
+        times = np.empty(chunk_size, dtype=np.int64)
+        states = np.empty(chunk_size, dtype=np.float64)
+        n = 0
+
+        with self.engine.connect().execution_options(stream_results=True, yield_per=chunk_size) as connection:
+            result = connection.execute(stmt)
+            for rows in result.partitions(chunk_size):
+                m = len(rows)
+                if n + m > times.shape[0]:# grow geometrically so the total copying stays linear
+                    capacity = max(2 * times.shape[0], n + m)
+                    times = self._grow(times, n, capacity)
+                    states = self._grow(states, n, capacity)
+                times[n:n + m] = np.fromiter((row[0] for row in rows), dtype=np.int64, count=m)
+                states[n:n + m] = np.fromiter((np.nan if row[1] is None else row[1] for row in rows), dtype=np.float64, count=m)
+                n += m
+                del rows
+
+        times = times[:n].copy()# release the unused tail of the buffers
+        states = states[:n].copy()
+        times *= 1000# microseconds to nanoseconds
+        return times, states
+
+    def _stream_many(self, entity_ids: list, start, end, chunk_size: int, since: dict=None) -> dict:
+        """
+        Stream several entities with one `entity_id = ANY(...)` query into a dict of `(times, states)`
+        arrays, keeping non-numeric states as NaN.
+
+        `since` optionally maps entity_ids to UTC nanoseconds; only samples after that time are fetched
+        for those entities, so each can be caught up from its own last cached sample in the same query.
+        """
+        chunks = {entity_id: ([], []) for entity_id in entity_ids}
+
+        table_obj = self.ltss_table
+        if table_obj is not None and entity_ids:
+            ids = bindparam('entity_ids', value=entity_ids, type_=ARRAY(Text))
+            stmt = (
+                select(table_obj.c.entity_id, self._epoch_microseconds(table_obj), self._numeric_state(table_obj))
+                .where(table_obj.c.entity_id == any_(ids))
+            )
+            if since:
+                stmt = stmt.where(or_(*(
+                    and_(table_obj.c.entity_id == entity_id, table_obj.c.time >= self._after(last).to_pydatetime())
+                    for entity_id, last in since.items()
+                )))
+            stmt = self._filter_time_window(stmt, table_obj.c.time, start, end).order_by(table_obj.c.entity_id, table_obj.c.time)
+
+            with self.engine.connect().execution_options(stream_results=True, yield_per=chunk_size) as connection:
+                result = connection.execute(stmt)
+                for rows in result.partitions(chunk_size):
+                    m = len(rows)
+                    entities = np.array([row[0] for row in rows], dtype=object)
+                    times = np.fromiter((row[1] for row in rows), dtype=np.int64, count=m)
+                    states = np.fromiter((np.nan if row[2] is None else row[2] for row in rows), dtype=np.float64, count=m)
+                    del rows
+
+                    # rows are ordered by entity, so each chunk holds a few contiguous runs
+                    bounds = np.concatenate(([0], np.flatnonzero(entities[1:] != entities[:-1]) + 1, [m]))
+                    for lo, hi in zip(bounds[:-1], bounds[1:]):
+                        entity_times, entity_states = chunks[entities[lo]]
+                        entity_times.append(times[lo:hi])
+                        entity_states.append(states[lo:hi])
+
+        timeseries = {}
+        for entity_id, (entity_times, entity_states) in chunks.items():
+            times = np.concatenate(entity_times) if entity_times else np.empty(0, dtype=np.int64)
+            states = np.concatenate(entity_states) if entity_states else np.empty(0, dtype=np.float64)
+            times *= 1000# microseconds to nanoseconds
+            timeseries[entity_id] = (times, states)
+            entity_times.clear()# let the chunk arrays go as soon as they are merged
+            entity_states.clear()
+
+        return timeseries
+
+    @staticmethod
+    def _dropna(times: np.ndarray, states: np.ndarray):
+        """
+        Drop samples whose state is NaN, i.e. states that were not numeric in the database.
+        """
+        valid = ~np.isnan(states)
+        if valid.all():
+            return times, states
+        return times[valid], states[valid]
+
+    @staticmethod
+    def _to_utc(timestamp) -> pd.Timestamp:
+        """
+        Convert a time bound to a UTC `pd.Timestamp`; naive times are taken as UTC.
+        """
+        timestamp = pd.Timestamp(timestamp)
+        return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+    @classmethod
+    def _to_nanoseconds(cls, timestamp):
+        """
+        Convert an optional time bound to UTC nanoseconds since the epoch; naive times are taken as UTC.
+        """
+        if timestamp is None:
+            return None
+        return cls._to_utc(timestamp).value
+
+    @staticmethod
+    def _after(time_ns: int) -> pd.Timestamp:
+        """
+        The first ltss time after `time_ns` UTC nanoseconds; ltss times have microsecond resolution.
+        """
+        return pd.Timestamp(time_ns + 1000, tz='UTC')
+
+    @staticmethod
+    def _grow(buffer, n: int, capacity: int):
+        """
+        Return a buffer of `capacity` elements holding the first `n` elements of `buffer`.
+        """
+        grown = np.empty(capacity, dtype=buffer.dtype)
+        grown[:n] = buffer[:n]
+        return grown
+
+    @staticmethod
+    def _epoch_microseconds(table_obj):
+        """
+        Sample time as integer microseconds since the epoch, which is exact for `timestamptz` and
+        avoids building a `datetime` object per row on the client.
+        """
+        return cast(func.extract('epoch', table_obj.c.time) * 1000000, BigInteger)
 
     def get_list(self):
         #TODO: implement getting a list of all appropriate elements ie sensors/actuators
         pass
 
-    def _resample_timeseries(self, df) -> pd.DataFrame:
+    @staticmethod
+    def _resample_arrays(times: np.ndarray, states: np.ndarray, method: str='zoh', interval=None):
+        """
+        The array form of `_resample_timeseries`, giving the same grid and values for numeric states (with
+        non-numeric states as NaN). Arrays with fewer than two distinct sample times are returned unchanged.
+        """
+        if interval is None:
+            interval = estimate_interval(times)
+            if interval is None:
+                return times, states
+        elif not isinstance(interval, (int, float)):
+            interval = pd.Timedelta(interval).total_seconds()
+        return resample(times, states, interval, method=method)
+
+    def _resample_timeseries(self, df, method: str='zoh', interval=None) -> pd.DataFrame:
         """
-        This Python function resamples a time series DataFrame to a common time interval based on the most
-        common time difference between samples.
+        This Python function resamples a time series DataFrame to a common time interval based on the typical
+        time difference between samples.
         
         :param df: The `resample_timeseries` function takes a DataFrame `df` as input and resamples it based
-        on the most common time interval found in the index of the DataFrame. The function calculates the
-        most common time interval between samples, rounds it to the nearest second, and then uses this
-        rounded interval to
-        :return: The function `resample_timeseries` is returning a resampled DataFrame with forward-filled
-        values based on the most common time interval found in the input DataFrame `df`.
+        on the typical time interval found in the index of the DataFrame, as estimated by
+        `resampling.estimate_interval` (which handles sub-second and irregular sampling).
+        :param method: The resampling strategy from `resampling.resample`: 'zoh' holds the latest state at
+        each grid instant (the previous forward-fill behaviour), 'mean' takes the time-weighted mean of each
+        interval and 'last' the last state in each interval. 'mean' and 'last' coerce the state to numbers.
+        :param interval: The grid spacing (seconds, Timedelta or string such as '1min'). Sparse, change-only
+        sensors should be given one explicitly, since the estimated interval can be very short.
+        :return: The function `resample_timeseries` is returning a resampled DataFrame computed directly from
+        the raw samples without expanding to a finer grid. DataFrames with fewer than two distinct sample
+        times are returned unchanged.
         """
         
-        time_diffs = df.index.to_series().diff() # get the difference between sample times
-        rounded_interval = time_diffs.mode()[0]# find most common time interval
-        common_interval_seconds = round(rounded_interval.total_seconds()) # find the most common and round
-        rounded_sample_time = pd.Timedelta(seconds=common_interval_seconds) # make these a Timedelta object
-        
-        #TODO: handle this properly, why do some timeseries returning div zero errors? Is it because not enough data is there?
-        try:
-            df = df.resample(rounded_sample_time).ffill()   
-            return df
-        except ZeroDivisionError:
-            return df
-
+        if interval is None:
+            interval = estimate_interval(df.index)
+            if interval is None:
+                return df
+        elif not isinstance(interval, (int, float)):
+            interval = pd.Timedelta(interval).total_seconds()
 
+        state = df['state'].to_numpy()
+        if method != 'zoh':
+            state = pd.to_numeric(df['state'], errors='coerce').to_numpy(dtype=np.float64)
 
-        
\ No newline at end of file
+        grid, state = resample(df.index, state, interval, method=method)
+        index = pd.DatetimeIndex(pd.to_datetime(grid, utc=True), name=df.index.name)
+        if df.index.tz is None:
+            index = index.tz_localize(None)
+        return pd.DataFrame({'state': state}, index=index)
@@ -0,0 +1,63 @@
+"""
+The `EntityState` class is a compact record of the state of one Home Assistant entity, used for the local
+state mirror kept by `SensorDataManager`.
+"""
+from datetime import datetime
+
+from data_management import json_backend
+
+
+class EntityState:
+    __slots__ = ('entity_id', 'state', 'last_changed', 'last_updated', '_attributes')
+
+    def __init__(self, entity_id: str, state: str, last_changed=None, attributes: dict = None, last_updated=None) -> None:
+        """
+        Create a state record. `last_changed` may be an ISO 8601 string (as in `get_states` and
+        `state_changed` events) or epoch seconds (as in `subscribe_entities`) and is stored as epoch seconds.
+        `last_updated`, in the same forms, also moves on attribute-only updates; it is never earlier than
+        `last_changed` and defaults to it. The attributes are kept as compact JSON bytes, which take a fraction of the memory of the decoded
+        dict, and are only decoded when `attributes` is read.
+        """
+        self.entity_id: str = entity_id
+        self.state: str = state
+        self.last_changed: float = self.__to_epoch(last_changed)
+        last_updated = self.__to_epoch(last_updated)
+        self.last_updated: float = self.last_changed if last_updated is None or self.last_changed is None else max(last_updated, self.last_changed)
+        self._attributes: bytes = json_backend.dumps_bytes(attributes) if attributes else b''
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Build a record from a state object as found in `get_states` replies and `state_changed` events.
+        """
+        return cls(data['entity_id'], data.get('state'), data.get('last_changed'), data.get('attributes'), data.get('last_updated'))
+
+    @staticmethod
+    def __to_epoch(timestamp):
+        if timestamp is None or isinstance(timestamp, (int, float)):
+            return timestamp
+        return datetime.fromisoformat(timestamp).timestamp()
+
+    @property
+    def attributes(self) -> dict:
+        """
+        The entity's attributes, decoded on every access; keep a reference if it is read repeatedly.
+        """
+        return json_backend.loads(self._attributes) if self._attributes else {}
+
+    def as_dict(self) -> dict:
+        return {
+            'entity_id': self.entity_id,
+            'state': self.state,
+            'last_changed': self.last_changed,
+            'last_updated': self.last_updated,
+            'attributes': self.attributes,
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, EntityState):
+            return NotImplemented
+        return (self.entity_id, self.state, self.last_changed, self._attributes) == (other.entity_id, other.state, other.last_changed, other._attributes)
+
+    def __repr__(self) -> str:
+        return f"EntityState({self.entity_id}={self.state!r} at {self.last_changed})"
@@ -0,0 +1,97 @@
+"""
+The `RingBuffer` class is a fixed-capacity store for a live timeseries: int64 UTC nanosecond timestamps
+and float64 states, appended in O(1) with the oldest samples dropped once it is full.
+"""
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity: int) -> None:
+        """
+        Create an empty buffer holding at most `capacity` samples.
+
+        Every sample is written twice, at its slot and at the slot plus `capacity`, so the newest samples
+        always form one contiguous run of memory and `window` can return plain NumPy views instead of
+        copying the two halves of the ring together. This doubles the memory used for an O(1) append and
+        zero-copy reads.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity: int = int(capacity)
+        self._times = np.empty(2 * self.capacity, dtype=np.int64)
+        self._states = np.empty(2 * self.capacity, dtype=np.float64)
+        self._end: int = 0# slot the next sample is written to
+        self._size: int = 0
+        self.version: int = 0# incremented on every change, so derived data can be cached against it
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes allocated for the buffer, whether or not it is full.
+        """
+        return self._times.nbytes + self._states.nbytes
+
+    def append(self, time: int, state: float) -> None:
+        """
+        Append one sample, overwriting the oldest one if the buffer is full.
+        """
+        self._times[self._end] = self._times[self._end + self.capacity] = time
+        self._states[self._end] = self._states[self._end + self.capacity] = state
+        self._end = (self._end + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.version += 1
+
+    def extend(self, times, states) -> None:
+        """
+        Append many samples in one vectorised write. Only the newest `capacity` of them are kept.
+        """
+        times = np.asarray(times, dtype=np.int64)[-self.capacity:]
+        states = np.asarray(states, dtype=np.float64)[-self.capacity:]
+        if times.shape != states.shape:
+            raise ValueError("times and states must have the same length")
+        if times.size == 0:
+            return
+
+        slots = (self._end + np.arange(times.size)) % self.capacity
+        for offset in (0, self.capacity):
+            self._times[slots + offset] = times
+            self._states[slots + offset] = states
+        self._end = int((self._end + times.size) % self.capacity)
+        self._size = min(self._size + times.size, self.capacity)
+        self.version += 1
+
+    def window(self, n: int = None):
+        """
+        Read-only views of the newest `n` samples (all of them if None), oldest first.
+
+        The views share memory with the buffer, so they are only valid until `capacity - n` further
+        samples have been appended; copy them to keep them longer.
+
+        :return: a `(times, states)` tuple of int64 nanosecond and float64 arrays
+        """
+        n = self._size if n is None else max(min(int(n), self._size), 0)
+        stop = self._end + self.capacity
+        times, states = self._times[stop - n:stop], self._states[stop - n:stop]
+        times.flags.writeable = False
+        states.flags.writeable = False
+        return times, states
+
+    def latest(self):
+        """
+        The newest `(time, state)` sample, or None if the buffer is empty.
+        """
+        if self._size == 0:
+            return None
+        slot = self._end - 1 + self.capacity
+        return int(self._times[slot]), float(self._states[slot])
+
+    def clear(self) -> None:
+        """
+        Drop every sample.
+        """
+        self._end = 0
+        self._size = 0
+        self.version += 1
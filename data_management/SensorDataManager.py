@@ -4,26 +4,65 @@ System (HAOS) using a WebSocket connection.
 """
 
 import asyncio
+from contextlib import aclosing
+from datetime import datetime, timezone
+import random
 import websockets
-import json
 import logging
 
+from data_management import json_backend
+from data_management.EntityState import EntityState
+
 
 class SensorDataManager:
-    def __init__(self, auth_token: str, websocket_url: str) -> None:
+    def __init__(self, auth_token: str, websocket_url: str, dbmanager=None, heartbeat_interval: float = 30, heartbeat_timeout: float = 10, max_backoff: float = 60) -> None:
         """
         Create an object to manage the authentication and the handling of data to and from HAOS.
+
+        :param dbmanager: optional `DatabaseManager`; when given, state changes missed while a supervised
+            connection was down are replayed from ltss to the subscriptions after reconnecting
+        :param heartbeat_interval: seconds between pings on a supervised connection
+        :param heartbeat_timeout: seconds to wait for a pong before treating the connection as dead
+        :param max_backoff: upper bound in seconds on the delay between reconnection attempts
         """
         self.auth_token: str = auth_token
         self.websocket_url: str = websocket_url
+        self.dbmanager = dbmanager
+        self.heartbeat_interval: float = heartbeat_interval
+        self.heartbeat_timeout: float = heartbeat_timeout
+        self.max_backoff: float = max_backoff
         self.message_id: int = 1# has to be more than zero. Has to increment. 
         self.subscribed_events: dict = {}# to retain ID's for subscribed events or triggers. 
+        self.connection = None
+        self._pending: dict = {}# message id -> future resolved with the `result` reply
+        self._event_queues: dict = {}# subscription id -> queue of pushed `event` payloads
+        self._reader_task = None
+        self.states: dict = {}# local mirror of every entity's state as `EntityState`, keyed by entity_id
+        self._mirror_task = None
+        self._mirror_queue = None
+        self._subscription_entities: dict = {}# subscription queue -> entity_ids to backfill after a reconnect
+        self._supervisor_task = None
+        self._closing: bool = False
+        self._last_received = None# time of the last message on the socket, where a backfill starts after a drop
 
 
-    async def connect(self) -> None:
+    async def connect(self, supervise: bool = False) -> None:
         """
         The `connect` method establishes a WebSocket connection to a Home Assistant Operating System (HAOS)
         instance and handles authentication.
+
+        :param supervise: keep the connection alive in the background: ping HAOS every `heartbeat_interval`
+            seconds and, if the socket drops, reconnect with exponential backoff, restore every active
+            subscription and backfill the missed state changes, so consumers see one continuous stream
+        """
+        self._closing = False
+        await self.__open()
+        if supervise and self._supervisor_task is None:
+            self._supervisor_task = asyncio.create_task(self.__supervise())
+
+    async def __open(self) -> None:
+        """
+        Open and authenticate a new socket and start the reader task on it.
         """
         self.connection = await websockets.connect(self.websocket_url)
         try:
@@ -33,20 +72,58 @@ class SensorDataManager:
             await self.connection.close()
             raise
 
+        # from here on only the reader task receives; everyone else waits on a future or a queue
+        self._last_received = datetime.now(timezone.utc)
+        self._reader_task = asyncio.create_task(self.__reader())
+
+    async def __reader(self) -> None:
+        """
+        Receive every message on the socket and route it: `result` and `pong` replies resolve the future
+        registered for their id, `event` messages go to the queue of the subscription with that id.
+        """
+        try:
+            async for raw in self.connection:
+                self._last_received = datetime.now(timezone.utc)# pongs included, so a quiet socket still counts
+                message = json_backend.loads(raw)
+                message_id = message.get("id")
+                logging.debug("Received %s message %s: %s", message.get("type"), message_id, json_backend.preview(raw))
+
+                if message.get("type") == "event":
+                    queue = self._event_queues.get(message_id)
+                    if queue is not None:# events for a subscription we have just cancelled are dropped
+                        queue.put_nowait(message["event"])
+                    continue
+
+                future = self._pending.pop(message_id, None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+            error = ConnectionError("WebSocket connection closed")
+        except Exception as e:
+            error = e
+
+        # wake everyone still waiting so nothing hangs on a dead socket
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        if self._supervisor_task is None or self._closing:# a supervised connection is restored, consumers keep waiting
+            for queue in self._event_queues.values():
+                queue.put_nowait(error)
+
     async def __authenticate(self) -> None:
         # Await the initial `auth_required` message from the server
         response = await self.connection.recv()
-        auth_required = json.loads(response)
+        auth_required = json_backend.loads(response)
         if auth_required.get("type") != "auth_required":
             raise Exception("Unexpected response during authentication phase")
 
         # Send the authentication message with the access token
-        auth_message = json.dumps({"type": "auth", "access_token": self.auth_token})
+        auth_message = json_backend.dumps({"type": "auth", "access_token": self.auth_token})
         await self.connection.send(auth_message)
 
         # Await the server's response to authentication
         response = await self.connection.recv()
-        auth_response = json.loads(response)
+        auth_response = json_backend.loads(response)
 
         if auth_response.get("type") == "auth_ok":
             print("Authentication successful")
@@ -55,54 +132,82 @@ class SensorDataManager:
         else:
             raise Exception("Unexpected response during authentication phase")
 
-    async def fetch_sensor_state(self, sensor_id) -> dict:
+    async def fetch_sensor_state(self, sensor_id) -> EntityState:
         """
-        This async function fetches specific sensor data by sending a request, receiving a response, and
-        returning the data as a dictionary after processing.
+        This async function fetches specific sensor data from the local state mirror, starting the mirror
+        on first use.
         
         :param sensor_id: The `sensor_id` parameter in the `fetch_sensor_state` method is used to specify
         the ID of the sensor for which you want to fetch the data. This ID is used to identify the specific
         sensor whose state you are interested in retrieving
-        :return: The method `fetch_sensor_state` is returning the specific sensor data as a dictionary.
+        :return: The method `fetch_sensor_state` is returning the specific sensor data as an `EntityState`,
+        or None if the entity does not exist. It used to return the raw state dict; read the fields as
+        attributes (`state.state`, `state.attributes`) or call `as_dict()` for a dict.
         """
-        sensor_request = json.dumps(
-            {"id": self.message_id, "type": "get_states"}
-        )
-        await self.connection.send(sensor_request)
-        data = await self.connection.recv()
-        self.message_id += 1
-        data_dict = json.loads(data)
-        
-        try: 
-            sensor_data = await self.__find_entity_by_id(data_dict, sensor_id)
-            if sensor_id == None:
-                raise NameError
-        except NameError as n:
-            print(f"Sensor ID could not be found:\n{n}")
-
-        #clears the variable to save cache
-        data.clear()
-        data_dict.clear()
+        if not self.mirroring:
+            await self.start_state_mirror()
+
+        sensor_data = self.states.get(sensor_id)
+        if sensor_data is None:
+            print(f"Sensor ID could not be found: {sensor_id}")
+
         return sensor_data
 
-    async def __find_entity_by_id(self, data, entity_id):
+    @property
+    def mirroring(self) -> bool:
         """
-        Search for a specific entity in the given data by its entity_id.
-        
-        Args:
-            data (dict): The complete JSON-like data structure.
-            entity_id (str): The entity ID to look for (e.g., 'person.seb').
+        True while the local state mirror is being kept up to date from `state_changed` events.
+        """
+        return self._mirror_task is not None and not self._mirror_task.done()
 
-        Returns:
-            dict: The matching entity dictionary or None if not found.
+    async def start_state_mirror(self) -> None:
         """
-            
-        if data.get('type') == 'result' and data.get('success'):
-            for entity in data.get('result', []):
-                if entity.get('entity_id') == entity_id:
-                    return entity
+        Keep `self.states` as a local copy of every entity's state so reads are dictionary lookups instead
+        of a `get_states` round-trip. The `state_changed` subscription is opened before the mirror is seeded
+        from `get_states`, so no change in between is missed: events queued during seeding are applied on
+        top of the snapshot afterwards.
+        """
+        if self.mirroring:
+            return
 
-        return None  # Return None if the entity was not found
+        subscription_id, queue = await self._open_subscription({"type": "subscribe_events", "event_type": "state_changed"})
+        try:
+            data = await self._request({"type": "get_states"})
+        except Exception:
+            await self.__unsubscribe_single(subscription_id)
+            raise
+        self.states = {entity["entity_id"]: EntityState.from_dict(entity) for entity in data.get("result", [])}
+        data.clear()# drop the decoded reply now rather than when the caller returns
+        self._mirror_queue = queue
+        self._mirror_task = asyncio.create_task(self.__mirror(queue))
+
+    async def __mirror(self, queue: asyncio.Queue) -> None:
+        """
+        Apply `state_changed` events to the mirror until the subscription ends.
+        """
+        while True:
+            event = await queue.get()
+            if isinstance(event, Exception):
+                return
+            data = event.get("data", {})
+            if data.get("new_state") is None:# the entity was removed
+                self.states.pop(data.get("entity_id"), None)
+            else:
+                self.states[data["entity_id"]] = EntityState.from_dict(data["new_state"])
+
+    async def stop_state_mirror(self) -> None:
+        """
+        Stop updating the local state mirror and cancel its subscription.
+        """
+        if self._mirror_task is None:
+            return
+        self._mirror_task.cancel()
+        await asyncio.gather(self._mirror_task, return_exceptions=True)
+        self._mirror_task = None
+        subscription_id = self.__subscription_id(self._mirror_queue)
+        if subscription_id in self.subscribed_events:
+            await self.__unsubscribe_single(subscription_id)
+        self._mirror_queue = None
 
     async def fetch_all_states(self) -> dict:
         """
@@ -112,138 +217,429 @@ class SensorDataManager:
         HAOS (Home Assistant Operating System) at the time the request is sent. If there is an error during
         the process, an empty dictionary `{}` is returned.
         """
-        states_request = json.dumps({
-            "id": self.message_id, 
-            "type": "get_states"
-        })
-
         if not self.connection:
             logging.error("WebSocket connection is not established.")
             return {}
 
         try:
-            # Log the outgoing request for debugging purposes
-            logging.info(f"Sending request: {states_request}")
-            await self.connection.send(states_request)
-
-            # Receive and log the server response
-            data = await self.connection.recv()
-            logging.info(f"Raw response received: {data}")
-
-            self.message_id += 1
-
-            # Parse and return the JSON response
-            return json.loads(data)
+            return await self._request({"type": "get_states"})
 
         except Exception as e:
             logging.error(f"Error during fetch_all_states: {e}")
             return {}
 
-    async def subscribe(self, event:str, type:str) -> bool:
+    def _next_id(self) -> int:
+        """
+        Reserve the next message id. There is no await between reading and incrementing the counter, so
+        concurrent tasks always get distinct ids.
+        """
+        message_id = self.message_id
+        self.message_id += 1
+        return message_id
+
+    async def _request(self, command: dict, message_id: int = None, timeout: float = None) -> dict:
+        """
+        Send `command` and wait for its `result` (or `pong`) reply without blocking other requests: the reply
+        is delivered by the reader task to a future keyed on the message id, so any number of requests can
+        be in flight on the one socket.
+
+        :param command: the message without its `id`
+        :param message_id: an id reserved with `_next_id`, if the caller needs to know it before sending
+        :param timeout: seconds to wait for the reply, or None to wait indefinitely
+        :return: the full reply message; a failed command raises an Exception with HAOS' error
+        """
+        if message_id is None:
+            message_id = self._next_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            logging.debug("Sending %s request %s", command.get("type"), message_id)
+            await self.connection.send(json_backend.dumps({"id": message_id, **command}))
+            message = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+        if message.get("type") == "result" and not message.get("success"):
+            raise Exception(f"{command.get('type')} failed: {message.get('error')}")
+        return message
+
+    def subscribe(self, event, type: str = "event"):
         """
         A method to subscribe to events or triggers. 
         Attributes:
-        event - string - the event or trigger name. 
-        type -  string - declares whether the event is a trigger or not
+        event - string or dict - the event type (e.g. 'state_changed') or, for triggers, the trigger config. 
+        type -  string - declares whether the event is a trigger ('trigger') or an event ('event')
+        Returns an async iterator over the received events.
+        """
+        if type == "event":
+            return self.subscribe_events(event)
+        elif type == "trigger":
+            return self.__subscription({"type": "subscribe_trigger", "trigger": event})
+        else:
+            raise ValueError("type must be either 'event' or 'trigger'")
+
+    async def subscribe_events(self, event_type: str = "state_changed", entity_ids: list = None):
+        """
+        Subscribe to `event_type` events and yield each event as it is pushed by HAOS.
+
+        :param event_type: the event type to subscribe to, `state_changed` by default
+        :param entity_ids: optionally only yield events whose `data.entity_id` is in this list
+        :return: an async iterator of event dicts; closing it unsubscribes
+        """
+        entity_ids = set(entity_ids) if entity_ids else None
+        async with aclosing(self.__subscription({"type": "subscribe_events", "event_type": event_type}, entity_ids)) as events:
+            async for event in events:
+                if entity_ids is None or event.get("data", {}).get("entity_id") in entity_ids:
+                    yield event
+
+    async def subscribe_entities(self, entity_ids: list):
+        """
+        Subscribe to state updates of `entity_ids` only, using the `subscribe_entities` command so HAOS
+        filters server-side and sends compact diffs instead of full state objects.
+
+        Yields `(entity_id, state)` tuples where `state` is an `EntityState`. The first updates are the
+        current states of all the entities.
         """
+        states = {}
+        async with aclosing(self.__subscription({"type": "subscribe_entities", "entity_ids": list(entity_ids)})) as events:
+            async for event in events:
+                for entity_id, compressed in event.get("a", {}).items():# added: full compressed state
+                    states[entity_id] = dict(compressed)
+                    yield entity_id, self.__expand_state(entity_id, states[entity_id])
+
+                for entity_id, diff in event.get("c", {}).items():# changed: apply the additions and removals
+                    compressed = states.setdefault(entity_id, {})
+                    additions = diff.get("+", {})
+                    for key, value in additions.items():
+                        if key == "a":
+                            compressed["a"] = {**compressed.get("a", {}), **value}
+                        else:
+                            compressed[key] = value
+                    for key in diff.get("-", {}).get("a", []):
+                        compressed.get("a", {}).pop(key, None)
+                    yield entity_id, self.__expand_state(entity_id, compressed)
 
+                for entity_id in event.get("r", []):# removed
+                    states.pop(entity_id, None)
 
-        # states_request = json.dumps({
-        #     'id': self.message_id,
-        #     'type': 'get_states'
-        # })
-        # await self.connection.send(states_request)
-        # data = await self.connection.recv()
-        # self.message_id += 1
-        # return json.loads(data)
+    @staticmethod
+    def __expand_state(entity_id: str, compressed: dict) -> EntityState:
+        """
+        Convert a compressed `subscribe_entities` state into an `EntityState`.
+        """
+        return EntityState(entity_id, compressed.get("s"), compressed.get("lc"), compressed.get("a"), compressed.get("lu"))
 
-        pass
+    async def __subscription(self, command: dict, entity_ids=None):
+        """
+        Send a subscription `command` and yield the `event` payload of every message pushed for it until the
+        iterator is closed, at which point the subscription is cancelled. `entity_ids` names the entities
+        whose missed `state_changed` events are backfilled after a reconnect.
+        """
+        subscription_id, queue = await self._open_subscription(command)
+        if entity_ids is not None:
+            self._subscription_entities[queue] = list(entity_ids)
+        try:
+            while True:
+                event = await queue.get()
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            subscription_id = self.__subscription_id(queue)# the id changes when a supervised connection is restored
+            self._event_queues.pop(subscription_id, None)
+            self._subscription_entities.pop(queue, None)
+            if subscription_id in self.subscribed_events and self._reader_task is not None and not self._reader_task.done():
+                await self.__unsubscribe_single(subscription_id)
+
+    def __subscription_id(self, queue):
+        """
+        The current id of the subscription feeding `queue`, or None if it has been cancelled.
+        """
+        for subscription_id, subscription_queue in self._event_queues.items():
+            if subscription_queue is queue:
+                return subscription_id
+        return None
+
+    async def _open_subscription(self, command: dict):
+        """
+        Send a subscription `command` and return `(subscription_id, queue)` once HAOS has accepted it. The
+        reader task puts every event pushed for the subscription on the queue.
+        """
+        subscription_id = self._next_id()
+        queue = asyncio.Queue()
+        self._event_queues[subscription_id] = queue# registered before sending so no early event is lost
+        try:
+            await self._request(command, message_id=subscription_id)
+        except Exception:
+            self._event_queues.pop(subscription_id, None)
+            raise
+        self.subscribed_events[subscription_id] = command
+        return subscription_id, queue
 
     async def unsubscribe(self, event=None):
-        success = False
         """
         A method to unsubscribe from a signular event or trigger. 
-        The event parameter determines what to unsubscribe from.
-        If the event is a single string then one single event is unsubscribed from. 
+        The event parameter is the subscription id returned when subscribing and determines what to unsubscribe from.
+        If the event is a single id then one single event is unsubscribed from. 
         If the event is a list then the list of events is unsubscribed from. 
         If the event is None then all are unsubscribed from (DEFAULT)
         """
 
-        if event == str:
-            self.__unsubscribe_single()
+        if isinstance(event, int):
+            await self.__unsubscribe_single(event)
         
-        elif event == list:
-            self.__unsubscribe_list()
+        elif isinstance(event, list):
+            await self.__unsubscribe_list(event)
         
-        elif event == None:
-            self.__unsubscribe_all()
+        elif event is None:
+            await self.__unsubscribe_all()
 
         else:
-            raise ValueError('Please enter either a string, list or None')
-
+            raise ValueError('Please enter either a subscription id, list or None')
 
-
-        pass
-
-    async def __unsubscribe_single(self, event_list:str):
+    async def __unsubscribe_single(self, subscription_id:int):
         """
-        A method to unsubscribe from a list of events
+        A method to unsubscribe from a single event
         """
-        pass
+        self.subscribed_events.pop(subscription_id, None)
+        self._event_queues.pop(subscription_id, None)
+        await self._request({"type": "unsubscribe_events", "subscription": subscription_id})
 
     async def __unsubscribe_list(self, event_list:list):
         """
         A method to unsubscribe from a list of events
         """
-        pass
+        for subscription_id in event_list:
+            await self.__unsubscribe_single(subscription_id)
 
     async def __unsubscribe_all(self):
         """
         A method to unsubscribe from all events or triggers. 
         """
+        await self.__unsubscribe_list(list(self.subscribed_events))
 
-        pass
-
-    async def fire_event(self, event):
+    async def fire_event(self, event_type: str, event_data: dict = None):
         """
         A method to fire events. 
+        Returns the context of the fired event.
         """
-        pass
+        command = {"type": "fire_event", "event_type": event_type}
+        if event_data:
+            command["event_data"] = event_data
+        message = await self._request(command)
+        return message.get("result")
 
-    async def call_service(self, service):
+    async def call_service(self, domain: str, service: str, service_data: dict = None, target: dict = None, timeout: float = None):
         """
-        A method to call a service.
+        A method to call a service, e.g. `call_service("switch", "turn_on", target={"entity_id": "switch.x"})`.
+        Returns the result of the call, which holds the context of the call.
+
+        :param service_data: optional data passed to the service
+        :param target: optional `entity_id`, `device_id` or `area_id` the service acts on
+        :param timeout: seconds to wait for HAOS to confirm the call, or None to wait indefinitely
         """
-        pass
+        command = {"type": "call_service", "domain": domain, "service": service}
+        if service_data:
+            command["service_data"] = service_data
+        if target:
+            command["target"] = target
+        message = await self._request(command, timeout=timeout)
+        return message.get("result")
 
     async def fetch_config(self):
         """
         A method to fetch the config of the HAOS instance.
         """
-        pass
+        message = await self._request({"type": "get_config"})
+        return message.get("result")
 
     async def fetch_all_services(self):
         """
         A method to fetch all services currently running within HAOS.
         """
-        pass
+        message = await self._request({"type": "get_services"})
+        return message.get("result")
 
     async def fetch_panels(self):
         """
         A method toget a dump of the current registered panels in HAOS.
         """
+        message = await self._request({"type": "get_panels"})
+        return message.get("result")
 
-    async def ping_pong(self):
+    async def ping_pong(self, timeout: float = None) -> bool:
         """ 
         A method to check connection via a ping pong response to HAOS. 
+
+        :param timeout: seconds to wait for the pong, defaults to `heartbeat_timeout`
+        :return: True if HAOS answered in time, False otherwise
         """
+        try:
+            await self._request({"type": "ping"}, timeout=self.heartbeat_timeout if timeout is None else timeout)
+        except Exception:
+            return False
+        return True
 
-    async def __error_handling(self):
+    async def __error_handling(self, error: Exception) -> None:
         """
-        Method to handle errors
+        Handle a connection that has failed or stopped answering: log it and make sure the socket is
+        closed and the reader has finished, so the supervisor can reconnect from a clean state.
         """
+        logging.warning(f"Connection to HAOS lost: {error}")
+        try:
+            await self.connection.close()
+        except Exception:
+            pass
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+    async def __supervise(self) -> None:
+        """
+        Watch the connection and restore it whenever it drops, until `close` is called.
+        """
+        while not self._closing:
+            error = await self.__heartbeat()
+            if self._closing:
+                return
+            disconnected_at = self._last_received# the drop was only noticed up to a heartbeat later
+            await self.__error_handling(error)
+            await self.__reconnect()
+            try:
+                await self.__restore_subscriptions(disconnected_at)
+            except Exception as e:# the new socket failed too, the heartbeat notices and we go round again
+                logging.warning(f"Error restoring subscriptions: {e}")
+
+    async def __heartbeat(self) -> Exception:
+        """
+        Ping HAOS every `heartbeat_interval` seconds and return once the reader stops or a ping goes
+        unanswered, with the reason.
+        """
+        while True:
+            done, _ = await asyncio.wait({self._reader_task}, timeout=self.heartbeat_interval)
+            if done:
+                return ConnectionError("WebSocket connection closed")
+            if not await self.ping_pong():
+                return TimeoutError(f"No pong within {self.heartbeat_timeout}s")
+
+    async def __reconnect(self) -> None:
+        """
+        Open a new authenticated connection, retrying with exponential backoff from one second up to
+        `max_backoff` seconds. The delay is jittered so several clients do not reconnect in lockstep.
+        """
+        delay = 1.0
+        while True:
+            try:
+                await self.__open()
+                logging.info("Reconnected to HAOS")
+                return
+            except Exception as e:
+                logging.warning(f"Reconnection failed: {e}, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.max_backoff)
+
+    async def __restore_subscriptions(self, disconnected_at: datetime) -> None:
+        """
+        Re-send every active subscription on the new connection. Each consumer's queue is moved to the new
+        subscription id, so its iterator simply continues. Before any live event is delivered, the state
+        changes recorded by ltss since `disconnected_at` are replayed into the queue; live events arriving
+        meanwhile are held back and appended afterwards, keeping the stream in order. A change that is both
+        backfilled and held back, matched on `(entity_id, last_updated)`, is only delivered once, live.
+        """
+        for old_id, command in list(self.subscribed_events.items()):
+            queue = self._event_queues.pop(old_id, None)
+            del self.subscribed_events[old_id]
+            if queue is None:# the consumer has gone away
+                continue
+
+            held = asyncio.Queue()
+            new_id = self._next_id()
+            self._event_queues[new_id] = held
+            try:
+                await self._request(command, message_id=new_id)
+            except Exception:
+                # leave the subscription as it was so the next attempt restores it
+                self._event_queues.pop(new_id, None)
+                self._event_queues[old_id] = queue
+                self.subscribed_events[old_id] = command
+                raise
+            self.subscribed_events[new_id] = command
+
+            backfill = await self.__backfill(command, queue, disconnected_at)
+            live = []
+            while not held.empty():
+                live.append(held.get_nowait())
+            seen = set().union(*(self.__event_keys(event) for event in live if isinstance(event, dict)))
+            for event in backfill:
+                if not self.__event_keys(event) & seen:
+                    queue.put_nowait(event)
+            for event in live:
+                queue.put_nowait(event)
+            self._event_queues[new_id] = queue
+
+        if self.mirroring:# reseed, the events queued since resubscribing are applied on top
+            data = await self._request({"type": "get_states"})
+            self.states = {entity["entity_id"]: EntityState.from_dict(entity) for entity in data.get("result", [])}
+
+    async def __backfill(self, command: dict, queue: asyncio.Queue, start: datetime) -> list:
+        """
+        Build the events a subscription would have received since `start` from the ltss history, in the
+        subscription's own format. Only subscriptions tied to known entities are backfilled.
+        """
+        if self.dbmanager is None:
+            return []
+        if command.get("type") == "subscribe_entities":
+            entity_ids = command["entity_ids"]
+        elif command.get("event_type") == "state_changed":
+            entity_ids = self._subscription_entities.get(queue)
+        else:
+            entity_ids = None
+        if not entity_ids:
+            return []
 
-        pass
+        try:
+            rows = await asyncio.to_thread(self.dbmanager.get_state_changes, entity_ids, start)
+        except Exception as e:
+            logging.warning(f"Could not backfill {entity_ids}: {e}")
+            return []
+
+        events = []
+        for entity_id, time, state, attributes in rows:
+            if command.get("type") == "subscribe_entities":
+                events.append({"c": {entity_id: {"+": {"s": state, "lc": time.timestamp()}}}})
+            else:
+                new_state = {"entity_id": entity_id, "state": state, "attributes": attributes or {}, "last_changed": time.isoformat(), "last_updated": time.isoformat()}
+                events.append({"event_type": "state_changed", "data": {"entity_id": entity_id, "new_state": new_state}, "origin": "BACKFILL"})
+        return events
+
+    @staticmethod
+    def __event_keys(event: dict) -> set:
+        """
+        The `(entity_id, last_updated)` pairs of the state changes carried by a `state_changed` or
+        `subscribe_entities` event, with the time as epoch seconds rounded to the microsecond.
+        """
+        keys = set()
+        data = event.get("data")
+        if data is not None:
+            new_state = data.get("new_state") or {}
+            updated = new_state.get("last_updated") or new_state.get("last_changed")
+            if updated is not None:
+                keys.add((data.get("entity_id"), round(datetime.fromisoformat(updated).timestamp(), 6)))
+        for group in ("a", "c"):# added and changed entities in the compressed format
+            for entity_id, compressed in event.get(group, {}).items():
+                compressed = compressed.get("+", compressed)
+                updated = compressed.get("lu", compressed.get("lc"))# lu is left out when it equals lc
+                if updated is not None:
+                    keys.add((entity_id, round(float(updated), 6)))
+        return keys
 
     async def close(self):
+        self._closing = True
+        if self._supervisor_task is not None:
+            self._supervisor_task.cancel()
+            await asyncio.gather(self._supervisor_task, return_exceptions=True)
+            self._supervisor_task = None
+        if self._mirror_task is not None:
+            self._mirror_task.cancel()
         await self.connection.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
@@ -0,0 +1,102 @@
+"""
+The `TimeseriesCache` class keeps a local, append-only copy of the ltss history of each entity so that
+`DatabaseManager` only has to ask the database for samples newer than the last cached one.
+"""
+import os
+import re
+
+import numpy as np
+
+
+class TimeseriesCache:
+    def __init__(self, directory: str) -> None:
+        """
+        Create a cache rooted at `directory`. Each entity gets its own sub-directory holding two flat
+        binary files, `time.i8` (int64 UTC nanoseconds) and `state.f8` (float64), which are appended to
+        in place and read back as memory maps.
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _entity_directory(self, entity_id: str) -> str:
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', entity_id)# entity ids are normally safe already
+        return os.path.join(self.directory, safe_name)
+
+    def _paths(self, entity_id: str):
+        entity_directory = self._entity_directory(entity_id)
+        return os.path.join(entity_directory, 'time.i8'), os.path.join(entity_directory, 'state.f8')
+
+    def __len(self, entity_id: str) -> int:
+        """
+        Number of complete samples on disk. If a previous append was interrupted the two files can
+        differ in length, in which case only the common prefix is trusted.
+        """
+        time_path, state_path = self._paths(entity_id)
+        if not (os.path.exists(time_path) and os.path.exists(state_path)):
+            return 0
+        return min(os.path.getsize(time_path) // 8, os.path.getsize(state_path) // 8)
+
+    def last_time(self, entity_id: str):
+        """
+        The time of the newest cached sample in UTC nanoseconds, or None if nothing is cached.
+        """
+        n = self.__len(entity_id)
+        if n == 0:
+            return None
+        time_path, _ = self._paths(entity_id)
+        with open(time_path, 'rb') as file:
+            file.seek((n - 1) * 8)
+            return int(np.frombuffer(file.read(8), dtype=np.int64)[0])
+
+    def append(self, entity_id: str, times: np.ndarray, states: np.ndarray) -> None:
+        """
+        Append samples newer than the last cached one. Older or duplicate samples are ignored so the
+        cache stays sorted by time.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        states = np.asarray(states, dtype=np.float64)
+
+        last = self.last_time(entity_id)
+        if last is not None:
+            newer = times > last
+            times, states = times[newer], states[newer]
+        if times.size == 0:
+            return
+
+        os.makedirs(self._entity_directory(entity_id), exist_ok=True)
+        time_path, state_path = self._paths(entity_id)
+        n = self.__len(entity_id)
+        for path, values in ((state_path, states), (time_path, times)):# time last, so a crash never advances last_time
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as file:
+                file.truncate(n * 8)# drop any partial write left by an interrupted append
+                file.seek(n * 8)
+                file.write(values.tobytes())
+
+    def load(self, entity_id: str, start=None, end=None):
+        """
+        Read-only memory-mapped views of the cached samples with `start <= time < end`, where the
+        bounds are UTC nanoseconds and either may be None.
+
+        :return: a `(times, states)` tuple; empty arrays if the entity is not cached
+        """
+        n = self.__len(entity_id)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        time_path, state_path = self._paths(entity_id)
+        times = np.memmap(time_path, dtype=np.int64, mode='r', shape=(n,))
+        states = np.memmap(state_path, dtype=np.float64, mode='r', shape=(n,))
+
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = n if end is None else int(np.searchsorted(times, end, side='left'))
+        return times[lo:hi], states[lo:hi]
+
+    def clear(self, entity_id: str=None) -> None:
+        """
+        Remove the cached history of `entity_id`, or of every entity if it is None.
+        """
+        entity_ids = [entity_id] if entity_id is not None else os.listdir(self.directory)
+        for name in entity_ids:
+            for path in self._paths(name):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,49 @@
+"""
+JSON encoding and decoding for the websocket traffic. Uses orjson when it is installed, which decodes the
+multi-megabyte `get_states` replies several times faster than the standard library, and falls back to
+`json` otherwise.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:# optional dependency
+    orjson = None
+
+
+def loads(data):
+    """
+    Decode a JSON document from `str`, `bytes` or `memoryview`.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """
+    Encode `obj` as a JSON `str`; websocket text frames need `str`, not `bytes`.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def dumps_bytes(obj) -> bytes:
+    """
+    Encode `obj` as compact JSON `bytes`, used to store payloads that are rarely read.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def preview(data, limit: int = 200) -> str:
+    """
+    A short, loggable prefix of a possibly very large payload, with its total length.
+    """
+    head = data[:limit]
+    if isinstance(head, (bytes, bytearray, memoryview)):
+        head = bytes(head).decode(errors='replace')
+    suffix = f"... ({len(data)} chars)" if len(data) > limit else ""
+    return f"{head}{suffix}"
@@ -0,0 +1,257 @@
+"""
+Vectorised helpers for working with the irregular, event-driven timeseries recorded by the ltss addon.
+Times are handled as int64 nanoseconds since the epoch so that every operation is a single NumPy pass.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def as_nanoseconds(times) -> np.ndarray:
+    """
+    Return `times` as an int64 array of nanoseconds since the epoch without copying where possible.
+    Accepts int64 nanoseconds, datetime64 arrays, a DatetimeIndex (tz-aware or naive) or a datetime Series,
+    as well as a single timestamp (returned as a 0-d array) or a list of timestamps or date strings.
+    Naive times are taken as UTC.
+    """
+    if isinstance(times, (str, datetime.datetime, np.datetime64)):
+        timestamp = pd.Timestamp(times)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        return np.array(timestamp.as_unit('ns').value, dtype=np.int64)
+    if isinstance(times, pd.Series):
+        times = pd.DatetimeIndex(times)
+    if isinstance(times, pd.DatetimeIndex):
+        return times.as_unit('ns').asi8
+    times = np.asarray(times)
+    if times.dtype.kind in 'OU':
+        return pd.DatetimeIndex(pd.to_datetime(times.ravel(), utc=True)).as_unit('ns').asi8.reshape(times.shape)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[ns]').view(np.int64)
+    return times.astype(np.int64, copy=False)
+
+
+def estimate_interval(times, resolution: float=1e-3):
+    """
+    Estimate the typical sample interval of sorted timestamps in one pass.
+
+    The median of the positive gaps between consecutive samples is used rather than the mode: it matches
+    the mode for regularly sampled sensors, is not thrown off by bursts of near-simultaneous updates from
+    event-driven sensors, and is computed by selection in O(n) instead of sorting or hashing every gap.
+
+    :param times: sorted timestamps in any form accepted by `as_nanoseconds`
+    :param resolution: the estimate is rounded to a multiple of this many seconds (and is never smaller),
+        so jitter does not leak into resampling frequencies; defaults to one millisecond
+    :return: the interval in seconds as a float, or None if there are fewer than two distinct timestamps
+    """
+    diffs = np.diff(as_nanoseconds(times))
+    diffs = diffs[diffs > 0]# repeated timestamps carry no spacing information
+    if diffs.size == 0:
+        return None
+
+    interval = float(np.median(diffs)) / 1e9
+    return max(round(interval / resolution), 1) * resolution
+
+
+RESAMPLING_METHODS = ('zoh', 'mean', 'last')
+
+
+def interval_grid(times, interval: float, buckets: bool=False) -> np.ndarray:
+    """
+    A regular int64 nanosecond grid with spacing `interval` seconds covering sorted `times`, aligned to
+    multiples of `interval` since the epoch like TimescaleDB's `time_bucket`.
+
+    :param buckets: if True the grid holds the start of every bucket that contains a sample (first point
+        at or before the first sample); otherwise it holds every grid instant inside the sampled range
+    """
+    times = as_nanoseconds(times)
+    step = int(round(interval * 1e9))
+    if times.size == 0 or step <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    first = -(-times[0] // step) * step if not buckets else times[0] // step * step# ceil or floor to the grid
+    last = times[-1] // step * step
+    n = max((last - first) // step + 1, 0)# integer count, np.arange sizes huge int64 ranges in floating point
+    return first + step * np.arange(n, dtype=np.int64)
+
+
+def zero_order_hold(times, values, grid) -> np.ndarray:
+    """
+    Sample a piecewise-constant signal at `grid`: each grid point takes the value of the most recent
+    sample at or before it, or NaN if it precedes the first sample.
+    """
+    times, grid = as_nanoseconds(times), as_nanoseconds(grid)
+    values = np.asarray(values)
+    idx = np.searchsorted(times, grid, side='right') - 1
+    out = values[np.clip(idx, 0, None)] if values.size else np.full(grid.shape, np.nan)
+    if values.dtype.kind in 'biuf':
+        out = out.astype(np.float64, copy=False)
+        out[idx < 0] = np.nan
+    else:
+        out = out.astype(object)
+        out[idx < 0] = None
+    return out
+
+
+def linear_interpolation(times, values, query) -> np.ndarray:
+    """
+    Linearly interpolate numeric samples at the `query` times, which need not be sorted. Queries outside
+    the sampled range are NaN rather than extrapolated.
+    """
+    times, query = as_nanoseconds(times), as_nanoseconds(query)
+    values = np.asarray(values, dtype=np.float64)
+    if times.size == 0:
+        return np.full(query.shape, np.nan)
+    origin = times[0]# interpolate on offsets, float64 can't hold absolute nanosecond times exactly
+    return np.interp((query - origin).astype(np.float64), (times - origin).astype(np.float64), values, left=np.nan, right=np.nan)
+
+
+SAMPLING_METHODS = ('zoh', 'linear')
+
+
+def sample_at(times, values, query, method: str='zoh'):
+    """
+    Look up the value of a sampled signal at arbitrary `query` times in one vectorised call, by binary
+    search on the sorted `times`.
+
+    :param times: sorted timestamps in any form accepted by `as_nanoseconds`
+    :param values: sample values; 'linear' requires numeric values
+    :param query: a single time or an array of times
+    :param method: 'zoh' holds the most recent sample, 'linear' interpolates between neighbouring samples
+    :return: an array shaped like `query`, or a scalar for a single time; NaN (None for non-numeric values)
+        where there is no sample to hold or interpolate
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"method must be one of {SAMPLING_METHODS}, got '{method}'")
+
+    query = as_nanoseconds(query)
+    flat = query.ravel()
+    if method == 'zoh':
+        out = zero_order_hold(times, values, flat)
+    else:
+        out = linear_interpolation(times, values, flat)
+    return out[0] if query.ndim == 0 else out.reshape(query.shape)
+
+
+def last_per_bucket(times, values, starts, interval: float) -> np.ndarray:
+    """
+    The last sample inside each bucket `[start, start + interval)`, or NaN for buckets without samples.
+    """
+    times, starts = as_nanoseconds(times), as_nanoseconds(starts)
+    values = np.asarray(values, dtype=np.float64)
+    step = int(round(interval * 1e9))
+
+    first = np.searchsorted(times, starts, side='left')
+    idx = np.searchsorted(times, starts + step, side='left') - 1
+    out = np.full(starts.shape, np.nan)
+    filled = idx >= first
+    out[filled] = values[idx[filled]]
+    return out
+
+
+def time_weighted_mean(times, values, starts, interval: float) -> np.ndarray:
+    """
+    The time-weighted mean of the zero-order-hold signal over each bucket `[start, start + interval)`.
+
+    Each sample is weighted by how long it was the current state, which is the correct average for
+    change-only sensors where a value persists until the next report. The running integral of the signal
+    is evaluated at the bucket edges with `searchsorted`, so the cost is O(samples + buckets) however
+    sparse the samples are. The part of a bucket before the first sample is ignored; buckets that end
+    before the first sample are NaN. NaN samples are skipped.
+    """
+    times, starts = as_nanoseconds(times), as_nanoseconds(starts)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if not valid.all():
+        times, values = times[valid], values[valid]
+    if times.size == 0:
+        return np.full(starts.shape, np.nan)
+
+    step = int(round(interval * 1e9))
+    elapsed = (times - times[0]) / 1e9# seconds since the first sample keeps the integral well conditioned
+    integral = np.concatenate(([0.0], np.cumsum(values[:-1] * np.diff(elapsed))))# integral up to each sample
+
+    def integral_at(edges):
+        edges = (np.maximum(edges, times[0]) - times[0]) / 1e9
+        k = np.searchsorted(elapsed, edges, side='right') - 1
+        return integral[k] + values[k] * (edges - elapsed[k]), edges
+
+    lower, lower_edges = integral_at(starts)
+    upper, upper_edges = integral_at(starts + step)
+    width = upper_edges - lower_edges
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(width > 0, (upper - lower) / width, np.nan)
+
+
+def resample(times, values, interval: float, method: str='zoh'):
+    """
+    Put an irregular timeseries onto a regular grid without first expanding it to the finest spacing.
+
+    :param times: sorted timestamps in any form accepted by `as_nanoseconds`
+    :param values: sample values; 'mean' and 'last' require numeric values
+    :param interval: grid spacing in seconds
+    :param method: 'zoh' samples the held value at each grid instant, 'mean' takes the time-weighted mean
+        of each bucket and 'last' the last sample of each bucket (buckets are labelled by their start)
+    :return: a `(grid, values)` tuple with the grid as int64 nanoseconds
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"method must be one of {RESAMPLING_METHODS}, got '{method}'")
+
+    grid = interval_grid(times, interval, buckets=method != 'zoh')
+    if method == 'zoh':
+        return grid, zero_order_hold(times, values, grid)
+    if method == 'mean':
+        return grid, time_weighted_mean(times, values, grid, interval)
+    return grid, last_per_bucket(times, values, grid, interval)
+
+
+def align(channels, interval: float=None, method: str='linear', start=None, end=None, dtype=np.float64):
+    """
+    Put several irregular timeseries onto one common regular grid in a single pass.
+
+    The grid spans the period covered by every channel (from the latest first sample to the earliest last
+    sample, optionally narrowed by `start`/`end`) with the finest of the channels' intervals, aligned to
+    multiples of the interval since the epoch. Each channel is filled by one vectorised `np.interp` or
+    zero-order-hold lookup straight into its column of a preallocated 2-D array, so the cost is
+    O(samples + grid points) per channel with no intermediate DataFrames.
+
+    :param channels: sequence of `(times, values)` pairs with sorted times in any form accepted by
+        `as_nanoseconds` and numeric values; NaN samples are skipped
+    :param interval: grid spacing in seconds; estimated from the channels if None
+    :param method: 'linear' interpolates between samples, 'zoh' holds the most recent sample
+    :param start: optional earliest grid time, in any form accepted by `as_nanoseconds`
+    :param end: optional latest grid time
+    :param dtype: dtype of the output array, float32 halves the memory for long multi-channel grids
+    :return: a `(grid, values)` tuple: the grid as int64 nanoseconds and a `(len(grid), len(channels))` array
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"method must be one of {SAMPLING_METHODS}, got '{method}'")
+
+    cleaned = []
+    for times, values in channels:
+        times, values = as_nanoseconds(times), np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        cleaned.append((times[valid], values[valid]) if not valid.all() else (times, values))
+    if not cleaned or any(times.size == 0 for times, _ in cleaned):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(cleaned)), dtype=dtype)
+
+    if interval is None:
+        intervals = [estimate_interval(times) for times, _ in cleaned]
+        intervals = [value for value in intervals if value is not None]
+        interval = min(intervals) if intervals else 1.0
+    first = max(times[0] for times, _ in cleaned)
+    last = min(times[-1] for times, _ in cleaned)
+    if start is not None:
+        first = max(first, int(as_nanoseconds(start)))
+    if end is not None:
+        last = min(last, int(as_nanoseconds(end)))
+    grid = interval_grid(np.array([first, last], dtype=np.int64), interval) if last >= first else np.empty(0, dtype=np.int64)
+
+    out = np.empty((grid.size, len(cleaned)), dtype=dtype)
+    for i, (times, values) in enumerate(cleaned):
+        if method == 'linear':
+            out[:, i] = linear_interpolation(times, values, grid)
+        else:
+            out[:, i] = zero_order_hold(times, values, grid)
+    return grid, out
@@ -9,6 +9,7 @@ from data_management.SensorDataManager import SensorDataManager
 from data_management.DatabaseManager import DatabaseManager
 from peripherals.Sensor import Sensor
 from peripherals.Actuator import Actuator
+from peripherals.PeripheralRegistry import PeripheralRegistry
 
 from dotenv import dotenv_values
 
@@ -16,17 +17,17 @@ from control.SystemIdentification import SystemIdentification
 from control.SignalProcessing import SignalProcessing as dsp
 
 
-async def init_subscriptions(datamanager:object, subscriptions_file:str):
+def init_subscriptions(datamanager:object, subscriptions_file:str):
     """
-    Reads the subscriptions file and initialises subscriptions via the datamanager object.
+    Reads the subscriptions file and subscribes to the sensors and actuators listed in it via the datamanager object.
+    Returns an async iterator of (entity_id, state) updates for those entities only.
     """
 
     with open (subscriptions_file, 'r') as file:
         subscriptions = yaml.safe_load(file)
     
-    for sensor_id in subscriptions.get("sensors", []):
-        await datamanager.subscribe_entity(sensor_id)
-    pass
+    entity_ids = (subscriptions.get("sensors") or []) + (subscriptions.get("actuators") or [])
+    return datamanager.subscribe_entities(entity_ids)
 
 
 async def main():
@@ -47,11 +48,17 @@ async def main():
         'db_host':db_host,
         'db_port':db_port,
         'db_user':db_user,
-        'db_password':db_password
+        'db_password':db_password,
+        'db_pool_size':config.get("DATABASE_POOL_SIZE"),
+        'db_max_overflow':config.get("DATABASE_MAX_OVERFLOW"),
+        'db_pool_timeout':config.get("DATABASE_POOL_TIMEOUT"),
+        'db_pool_recycle':config.get("DATABASE_POOL_RECYCLE"),
+        'db_pool_pre_ping':config.get("DATABASE_POOL_PRE_PING"),
     }
 
 
-    dbmanager = DatabaseManager(credentials=credentials_dict)# instantiate an object for the database
+    dbmanager = DatabaseManager(credentials=credentials_dict, cache_dir=config.get("CACHE_DIRECTORY"))# instantiate an object for the database
+    registry = PeripheralRegistry(dbmanager)# hands out one shared instance per entity and window
     # table = dbmanager.get_database_table('ltss')#this returns an sqlalchemy table object. 
     
     # print(f"Table Name: {table.name}")
@@ -101,9 +108,10 @@ async def main():
     # print(test_model.model.coefficients())
 
 
-    radiator_consumption = Sensor(dbmanager=dbmanager, identifier="sensor.smart_plug_radiator_current_consumption")# TODO: this data is problematic
-    room_temperature = Sensor(dbmanager=dbmanager, identifier="sensor.esphome_web_38fb3c_bme280_temperature")
-    outside_temperature = Sensor(dbmanager=dbmanager, identifier="sensor.home_realfeel_temperature")
+    # one bulk query for all the sensors instead of one query per Sensor(...)
+    room_temperature, outside_temperature = registry.get_many(sensor_name_list[1:])
+    # the plug only reports changes, so average it onto an explicit grid rather than holding each change
+    radiator_consumption = registry.get(sensor_name_list[0], resample='mean', interval='1min')
     # radiator_switch = Actuator(dbmanager=dbmanager, identifier="switch.smart_plug_radiator")
 
 
@@ -134,7 +142,7 @@ async def main():
     
     # print(SignalProcessing.signaltonoise(room_temperature_y), SignalProcessing.signaltonoise(room_temperature_y, detrend=True), SignalProcessing.signaltonoise(filtered_data))
 
-    outside_temperature = Sensor(dbmanager=dbmanager, identifier="sensor.home_realfeel_temperature")
+    outside_temperature = registry.get("sensor.home_realfeel_temperature")# already loaded above, not queried again
     # SignalProcessing.fourier_transform(outside_temp_timeseries_y, outside_temp_timestep, plot=True)
     # filtered_outdoor_temp = SignalProcessing.butter_lowpass_filter(data=outside_temp_timeseries_y, cutoff=0.0002, timestep=outside_temp_timestep)
 
@@ -146,7 +154,7 @@ async def main():
 
     #TODO: radiator consumption data can't be filtered as above if you use the whole dataset since there are a lot of on/offs and it creates a lot of problems with overshooting.
     #TODO: solution could be to collect the 'on' states together then distribute them once the data is filtered. This may cause issues with the timestep. 
-    radiator_consumption = Sensor(dbmanager=dbmanager, identifier="sensor.smart_plug_radiator_current_consumption")
+    radiator_consumption = registry.get("sensor.smart_plug_radiator_current_consumption", resample='mean', interval='1min')# the instance loaded above
     # radiator_consumption_timestep = radiator_consumption.get_timestep()
     # radiator_consumption_timeseries_x, radiator_consumption_timeseries_y = radiator_consumption.get_timeseries(numpy=True)
     # SignalProcessing.fourier_transform(radiator_consumption_timeseries_y, timestep=radiator_consumption_timestep, plot=True)
@@ -178,10 +186,11 @@ async def main():
 
 
 ### websocket code. 
-    datamanager = SensorDataManager(auth_token=__auth, websocket_url=url)
-    await datamanager.connect()
+    datamanager = SensorDataManager(auth_token=__auth, websocket_url=url, dbmanager=dbmanager)
+    await datamanager.connect(supervise=True)# reconnects and backfills from ltss if the socket drops
 
-    # await init_subscriptions(datamanager, yaml_file)
+    # async for entity_id, state in init_subscriptions(datamanager, yaml_file):
+    #     print(entity_id, state.state)# state is an EntityState, not a dict
     sensor_data = await datamanager.fetch_sensor_state("person.seb")
     print(sensor_data)
 
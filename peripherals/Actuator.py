@@ -1,22 +1,140 @@
 
 import re
+
+import numpy as np
+import pandas as pd
+
+from data_management.resampling import as_nanoseconds, sample_at
 from peripherals.Peripheral import Peripheral
 
 class Actuator(Peripheral):
-    def __init__(self, dbmanager, identifier=None, virtual=False, **attributes) -> None:
+    def __init__(self, dbmanager, identifier=None, virtual=False, start=None, end=None, bucket=None, resample='zoh', interval=None, lazy=False, **attributes) -> None:
+        """
+        Create an actuator whose history is loaded from `dbmanager`, taking the last state in each `bucket`
+        or putting the samples on an `interval` grid with `resample`, as `Sensor` does. With `lazy=True`
+        only the attributes are fetched (or taken from `attributes` if given) and the history is loaded on
+        first access, or explicitly, for any window, with `load`.
+        """
         self.virtual = virtual
         self.identifier = identifier
+        self._times = np.empty(0, dtype=np.int64)# int64 UTC nanoseconds
+        self._states = np.empty(0, dtype=np.float64)# 1.0 (on) / 0.0 (off)
+        self._frames = {}# DataFrame views of the arrays by kind, built on demand
+        self._dbmanager = None
+        self._query = None# get_timeseries arguments used when the history is loaded
+        self._loaded = True
         if not re.match(r'^switch\.', identifier):
             raise ValueError("Identifier does not indicate an actuator or switch")
         
         # If the actuator is real
         if identifier:
-            self.df = dbmanager.get_timeseries(identifier)
-            self.timeseries = self.df.reset_index()[['time','state']]
-            self.initialise_attributes_from_df()
+            self._dbmanager = dbmanager
+            self._query = {'start': start, 'end': end, 'bucket': bucket, 'aggregate': 'last', 'resample': resample, 'interval': interval}# switch states can't be averaged
+            self._loaded = False
+            self.update_attributes(attributes or dbmanager.get_attributes(identifier))# fetched once rather than stored per row
+            if not lazy:
+                self.load()
+
+    def load(self, start=None, end=None):
+        """
+        Load the actuator's history from the database. `start` and `end` override the window given to the
+        constructor for this load; the result is kept until the next call. States are stored as 1.0 (on) /
+        0.0 (off), as `from_arrays` stores them, and rows with any other state, such as 'unavailable', are
+        dropped.
+
+        :return: the actuator itself
+        """
+        query = dict(self._query)
+        if start is not None:
+            query['start'] = start
+        if end is not None:
+            query['end'] = end
+        df = self._dbmanager.get_timeseries(self.identifier, **query)
+        states = pd.to_numeric(df['state'].replace({'on': 1.0, 'off': 0.0}), errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(states)
+        self.load_arrays(as_nanoseconds(df.index)[valid], states[valid])# only the arrays are kept
+        return self
+
+    def load_arrays(self, times, states):
+        """
+        Replace the actuator's samples with sorted `times` (int64 UTC nanoseconds) and float `states`.
+        """
+        self._times = np.asarray(times, dtype=np.int64)
+        self._states = np.asarray(states, dtype=np.float64)
+        self._frames = {}
+        self._loaded = True
+
+    def get_arrays(self):
+        """
+        The sample times as int64 UTC nanoseconds and the states as 1.0 (on) / 0.0 (off).
+        """
+        if not self._loaded:
+            self.load()
+        return self._times, self._states
+
+    @property
+    def loaded(self) -> bool:
+        """
+        False while a lazily created actuator has not fetched its history yet.
+        """
+        return self._loaded
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The samples as a DataFrame indexed by `time` with a `state` column, built over the arrays when
+        first asked for. Treat it as read-only.
+        """
+        return self.__frame('df')
+
+    @property
+    def timeseries(self) -> pd.DataFrame:
+        """
+        The samples as a DataFrame with `time` and `state` columns. Treat it as read-only.
+        """
+        return self.__frame('timeseries')
+
+    def __frame(self, kind: str) -> pd.DataFrame:
+        times, states = self.get_arrays()
+        if kind not in self._frames:
+            time = pd.DatetimeIndex(times.view('datetime64[ns]'), name='time').tz_localize('UTC')
+            if kind == 'df':
+                self._frames[kind] = pd.DataFrame({'state': states}, index=time, copy=False)
+            else:
+                self._frames[kind] = pd.DataFrame({'time': time, 'state': states}, copy=False)
+        return self._frames[kind]
+
+    def memory_usage(self) -> int:
+        """
+        Bytes held by the actuator's history: the arrays plus any materialised DataFrames.
+        """
+        total = self._times.nbytes + self._states.nbytes
+        for frame in self._frames.values():
+            total += int(frame.memory_usage(index=True).sum())
+        return total
+
+    @classmethod
+    def from_arrays(cls, times, states, identifier, **attributes):
+        """
+        Build an actuator directly from columnar arrays, such as those returned by
+        `DatabaseManager.get_timeseries_arrays`, where switch states are encoded as 1.0 (on) / 0.0 (off),
+        the same representation `load` produces.
+        """
+        if not re.match(r'^switch\.', identifier):
+            raise ValueError("Identifier does not indicate an actuator or switch")
+
+        actuator = cls.__new__(cls)# skip the database load in __init__
+        actuator.virtual = False
+        actuator.identifier = identifier
+        actuator._dbmanager = None
+        actuator.load_arrays(as_nanoseconds(pd.to_datetime(times, utc=True)), np.asarray(states, dtype=np.float64))
+        actuator.update_attributes(attributes)
+        return actuator
 
     def initialise_attributes_from_df(self):
-        # Extract attributes from the first non-null row in the DataFrame
+        # Extract attributes from the first non-null row in the DataFrame, if it carries them
+        if 'attributes' not in self.df:
+            return
         first_valid_index = self.df['attributes'].first_valid_index()
         if first_valid_index is not None:
             attributes = self.df.loc[first_valid_index, 'attributes']
@@ -44,8 +162,39 @@ class Actuator(Peripheral):
         timeseries = self.timeseries.dropna()
         return timeseries
 
-    def get_state_at_time(self, time):
-        pass
+    def turn_on(self, batcher) -> None:
+        """
+        Queue a `turn_on` command in `batcher`, a `CommandBatcher`; it is sent on the batcher's next flush.
+        """
+        self.command(batcher, "turn_on")
+
+    def turn_off(self, batcher) -> None:
+        """
+        Queue a `turn_off` command in `batcher`, a `CommandBatcher`; it is sent on the batcher's next flush.
+        """
+        self.command(batcher, "turn_off")
+
+    def command(self, batcher, service: str, **service_data) -> None:
+        """
+        Queue a call to `service` on this actuator in `batcher`, passing any keyword arguments as the
+        service data.
+        """
+        if self.virtual:
+            raise ValueError("Virtual actuators can't be commanded")
+        batcher.queue(self.identifier, service, service_data or None)
+
+    def get_state_at_time(self, time, method='zoh'):
+        """
+        The actuator's state at `time`, a single time or an array of times (naive times are taken as UTC),
+        found by binary search on the sample times rather than by scanning the DataFrame.
+
+        :param method: 'zoh' holds the most recent state; 'linear' interpolates between the states either
+            side, giving the fraction of the time the actuator was on
+        :return: a float (1.0 on, 0.0 off) for a single time, otherwise an array of floats; NaN before the
+            first sample
+        """
+        times, states = self.get_arrays()
+        return sample_at(times, states, time, method)
 
     def plot(self):
         pass
@@ -19,7 +19,7 @@ class Peripheral(ABC):
         pass
 
     @abstractmethod
-    def get_state_at_time(self, time):
+    def get_state_at_time(self, time, method='zoh'):
         pass
 
     @abstractmethod
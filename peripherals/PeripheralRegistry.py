@@ -0,0 +1,139 @@
+"""
+The `PeripheralRegistry` class sits in front of `peripheral_factory` and hands out one shared `Sensor` or
+`Actuator` per entity and time window, so the same history is not queried and held several times.
+"""
+from collections import OrderedDict
+
+import pandas as pd
+
+from peripherals.peripheral_factory import peripheral_factory, peripherals_factory
+
+
+class PeripheralRegistry:
+    def __init__(self, dbmanager, memory_budget: int = 512 * 2**20) -> None:
+        """
+        Create a registry loading peripherals from `dbmanager`.
+
+        :param memory_budget: bytes of sample data the registry may hold; past it the least recently used
+            peripherals are dropped (callers still holding them keep them alive, but they are no longer shared)
+        """
+        self.dbmanager = dbmanager
+        self.memory_budget: int = memory_budget
+        # (entity_id, start, end, bucket, resample, interval) -> peripheral, least recently used first
+        self.peripherals: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _key(identifier: str, start=None, end=None, bucket=None, resample='zoh', interval=None) -> tuple:
+        return (
+            identifier,
+            None if start is None else pd.Timestamp(start),
+            None if end is None else pd.Timestamp(end),
+            PeripheralRegistry._duration(bucket),
+            resample,
+            PeripheralRegistry._duration(interval),
+        )
+
+    @staticmethod
+    def _duration(value):
+        """
+        `value` (seconds, Timedelta, timedelta or a string such as '1min') as a Timedelta, so equal
+        durations written differently share a key.
+        """
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return pd.Timedelta(seconds=value)
+        return pd.Timedelta(value)
+
+    def get(self, identifier: str, start=None, end=None, lazy: bool = False, bucket=None, resample: str = 'zoh', interval=None):
+        """
+        The shared peripheral for `identifier` over the `start`/`end` window, built with
+        `peripheral_factory` the first time it is asked for. `bucket`, `resample` and `interval` are
+        passed on to the peripheral; each combination is a separate peripheral.
+        """
+        key = self._key(identifier, start, end, bucket, resample, interval)
+        if key in self.peripherals:
+            self.peripherals.move_to_end(key)
+            return self.peripherals[key]
+
+        peripheral = peripheral_factory(self.dbmanager, identifier, start=start, end=end, lazy=lazy, bucket=bucket, resample=resample, interval=interval)
+        self.peripherals[key] = peripheral
+        self.__enforce_budget()
+        return peripheral
+
+    def get_many(self, identifiers: list, start=None, end=None, bucket=None, resample: str = 'zoh', interval=None) -> list:
+        """
+        The shared peripherals for `identifiers` over one window, in the same order. Those not registered
+        yet are loaded together with one bulk `peripherals_factory` query, which resamples them like
+        `get` does, so a peripheral is the same whichever method loaded it first.
+        """
+        options = {'bucket': bucket, 'resample': resample, 'interval': interval}
+        keys = [self._key(identifier, start, end, **options) for identifier in identifiers]
+        missing = list(dict.fromkeys(key[0] for key in keys if key not in self.peripherals))
+        if missing:
+            for identifier, peripheral in zip(missing, peripherals_factory(self.dbmanager, missing, start=start, end=end, **options)):
+                self.peripherals[self._key(identifier, start, end, **options)] = peripheral
+
+        peripherals = []
+        for key in keys:
+            self.peripherals.move_to_end(key)
+            peripherals.append(self.peripherals[key])
+        self.__enforce_budget(keep=len(set(keys)))
+        return peripherals
+
+    def invalidate(self, identifier: str = None, time=None) -> None:
+        """
+        Forget registered peripherals so the next request reloads them. Call this when new data for an
+        entity arrives.
+
+        :param identifier: the entity whose peripherals are dropped, or None for every entity
+        :param time: if given, only windows containing this time are dropped, since closed historical
+            windows are unaffected by new samples
+        """
+        time = None if time is None else pd.Timestamp(time)
+        for key in list(self.peripherals):
+            entity_id, start, end = key[:3]
+            if identifier is not None and entity_id != identifier:
+                continue
+            if time is not None and not self.__contains(start, end, time):
+                continue
+            del self.peripherals[key]
+
+    async def follow(self, updates) -> None:
+        """
+        Invalidate peripherals as state updates arrive, e.g. from `SensorDataManager.subscribe_entities`.
+
+        :param updates: an async iterator of `(entity_id, state)` tuples
+        """
+        async for entity_id, state in updates:
+            self.invalidate(entity_id, time=pd.Timestamp.now(tz='UTC'))
+
+    def memory_usage(self) -> int:
+        """
+        Bytes of sample data held by the registered peripherals.
+        """
+        return sum(peripheral.memory_usage() for peripheral in self.peripherals.values())
+
+    def __len__(self) -> int:
+        return len(self.peripherals)
+
+    def __enforce_budget(self, keep: int = 1) -> None:
+        """
+        Drop least recently used peripherals until the registry fits its budget, always keeping the `keep`
+        most recently used ones.
+        """
+        usage = {key: peripheral.memory_usage() for key, peripheral in self.peripherals.items()}
+        total = sum(usage.values())
+        while total > self.memory_budget and len(self.peripherals) > keep:
+            key, _ = self.peripherals.popitem(last=False)
+            total -= usage[key]
+
+    @staticmethod
+    def __contains(start, end, time) -> bool:
+        if time.tzinfo is None:
+            time = time.tz_localize('UTC')
+        if start is not None and time < (start if start.tzinfo else start.tz_localize('UTC')):
+            return False
+        if end is not None and time >= (end if end.tzinfo else end.tz_localize('UTC')):
+            return False
+        return True
@@ -2,7 +2,6 @@
 A class to store data about specific sensors, and potentially create virtual sensors
 """
 import math
-import random
 import re
 import datetime
 
@@ -13,14 +12,50 @@ import matplotlib.pyplot as plt
 
 from data_management.SensorDataManager import SensorDataManager
 from data_management.DatabaseManager import DatabaseManager
+from data_management.resampling import as_nanoseconds, estimate_interval, sample_at
+from data_management.RingBuffer import RingBuffer
 from peripherals.Peripheral import Peripheral
 
 
 class Sensor(Peripheral):
-    def __init__(self, dbmanager=None, identifier=None, virtual=False, **attributes):
+    DEFAULT_CAPACITY = 100_000# live samples kept on top of the loaded history
+    TAIL_CAPACITY = 1024# live samples buffered before they are merged into the history arrays
+
+    def __init__(self, dbmanager=None, identifier=None, virtual=False, start=None, end=None, bucket=None, resample='zoh', interval=None, capacity=None, lazy=False, **attributes):
+        """
+        Create a sensor. Real sensors load their history from `dbmanager`, optionally restricted to the
+        `start`/`end` window and averaged into `bucket` wide intervals inside the database. Without a
+        bucket the samples are put on a regular `interval` grid using the `resample` strategy ('zoh',
+        'mean' or 'last'); sparse, change-only sensors are best loaded with 'mean' and an explicit interval.
+
+        The samples are held in one int64 time array and one float64 state array. Live updates are appended
+        in O(1) to a small `RingBuffer` tail, allocated on the first update, from which `window`,
+        `get_latest_state` and `get_state_at_time` read recent samples directly. The tail is copied into
+        spare space at the end of the arrays when it fills up or the whole history is read, so every sample
+        is copied once rather than the history being rebuilt. At most `capacity` samples are kept, by
+        default the loaded history plus `DEFAULT_CAPACITY` live updates; past that the oldest are dropped.
+
+        With `lazy=True` only the attributes are fetched (or taken from `attributes` if given); the history
+        is loaded on first access to the samples, or explicitly, for any window, with `load`.
+        """
         
         self.virtual = virtual
         self.identifier = identifier
+        self.attributes = {}
+        self.capacity = capacity
+        self._limit = capacity or self.DEFAULT_CAPACITY# samples kept at most, reset when the history is loaded
+        self._times = np.empty(0, dtype=np.int64)# the samples are [_start:_end], the rest is spare space
+        self._states = np.empty(0, dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self._tail = None# RingBuffer of live samples not merged into the arrays yet, allocated on first use
+        self._dbmanager = None
+        self._query = None# get_timeseries arguments used when the history is loaded
+        self._loaded = True
+        self._frames = {}# DataFrame views of the arrays by kind, with the data version they were built at
+        self._generation = 0# incremented whenever the samples are replaced, see data_version
+        self._updates = 0# live samples appended since the samples were replaced
+        self._timestep = None# cached by get_timestep
         
         
         # If the sensor is real
@@ -28,49 +63,242 @@ class Sensor(Peripheral):
             if not re.match(r'^sensor\.', identifier):
                 raise ValueError("Identifier does not indicate a sensor")
         
-            self.df = dbmanager.get_timeseries(identifier)# time is index on the real sensors already
-            self.timeseries = self.df.reset_index()[['time','state']]
-            self.timeseries['state']=pd.to_numeric(self.timeseries["state"], errors='coerce').values
-            self.timeseries = self.timeseries.dropna()
-            self.initialise_attributes_from_df()
-            self.x = np.array(self.timeseries.index)#should be date
-            self.y = np.array(self.timeseries["state"])#should be value
+            self._dbmanager = dbmanager
+            self._query = {'start': start, 'end': end, 'bucket': bucket, 'resample': resample, 'interval': interval}
+            self._loaded = False
+            self.update_attributes(attributes or dbmanager.get_attributes(identifier))# fetched once rather than stored per row
+            if not lazy:
+                self.load()
         
         elif virtual:
             self.generate_virtual_data(randomise=True)
 
+    def load(self, start=None, end=None):
+        """
+        Load the sensor's history from the database, replacing any samples already held. `start` and
+        `end` override the window given to the constructor for this load; the result is kept until the
+        next call.
+
+        :return: the sensor itself
+        """
+        if self._dbmanager is None:
+            raise ValueError("Sensor has no database to load its history from")
+
+        query = dict(self._query)
+        if start is not None:
+            query['start'] = start
+        if end is not None:
+            query['end'] = end
+        df = self._dbmanager.get_timeseries(self.identifier, **query)# time is index on the real sensors already
+        states = pd.to_numeric(df['state'], errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(states)
+        self.load_arrays(as_nanoseconds(df.index)[valid], states[valid])# only the arrays are kept
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        """
+        False while a lazily created sensor has not fetched its history yet.
+        """
+        return self._loaded
+
+    def __ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def __merge_tail(self) -> None:
+        """
+        Move the live samples from the tail into the spare space after the arrays' samples, dropping the
+        oldest samples past the limit. Only the slots past every view handed out so far are written, and
+        running out of space moves the samples to new, larger arrays, so earlier views never change.
+        """
+        m = len(self._tail) if self._tail is not None else 0
+        if m == 0:
+            return
+        if self._end + m > self._times.size:
+            held = self._end - self._start
+            capacity = held + m + max(held // 8, self.TAIL_CAPACITY)# grows geometrically, so copies stay O(1) per sample
+            times = np.empty(capacity, dtype=np.int64)
+            states = np.empty(capacity, dtype=np.float64)
+            times[:held] = self._times[self._start:self._end]
+            states[:held] = self._states[self._start:self._end]
+            self._times, self._states, self._start, self._end = times, states, 0, held
+
+        times, states = self._tail.window()
+        self._times[self._end:self._end + m] = times
+        self._states[self._end:self._end + m] = states
+        self._end += m
+        self._start = max(self._start, self._end - self._limit)
+        self._tail.clear()
+        self._frames = {}
+
+    def __arrays(self):
+        """
+        Read-only views of all the samples, loading the history and merging the live tail first.
+        """
+        self.__ensure_loaded()
+        self.__merge_tail()
+        times = self._times[self._start:self._end]
+        states = self._states[self._start:self._end]
+        times.flags.writeable = False
+        states.flags.writeable = False
+        return times, states
+
+    def window(self, n: int):
+        """
+        The newest `n` samples (fewer if the sensor holds fewer) as read-only `(times, states)` views,
+        without copying or merging the live tail when they are all in it.
+
+        Views of the tail are only valid until the next `update_series`; copy them to keep them longer.
+        """
+        self.__ensure_loaded()
+        n = max(int(n), 0)
+        if self._tail is not None and n <= len(self._tail):
+            return self._tail.window(n)
+        times, states = self.__arrays()
+        n = min(n, times.size)
+        return times[times.size - n:], states[states.size - n:]
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The samples as a DataFrame indexed by `time` with a `state` column. See `timeseries`.
+        """
+        return self.__frame('df')
+
+    def memory_usage(self) -> int:
+        """
+        Bytes held by the sensor's samples: the arrays, the live tail if allocated and any materialised
+        DataFrames.
+        """
+        total = self._times.nbytes + self._states.nbytes# spare space included
+        if self._tail is not None:
+            total += self._tail.nbytes
+        for _, frame in self._frames.values():
+            total += int(frame.memory_usage(index=True).sum())
+        return total
+
+    @classmethod
+    def from_arrays(cls, times, states, identifier=None, **attributes):
+        """
+        Build a sensor directly from columnar arrays, such as those returned by
+        `DatabaseManager.get_timeseries_arrays`, without going through a row-wise query result.
+
+        :param times: int64 UTC nanoseconds since the epoch (or anything `pd.to_datetime` accepts)
+        :param states: numeric sensor values, one per entry in `times`
+        :param identifier: optional entity_id of the sensor
+        :return: a `Sensor` whose `df`, `timeseries`, `x` and `y` are built from the arrays
+        """
+        if identifier and not re.match(r'^sensor\.', identifier):
+            raise ValueError("Identifier does not indicate a sensor")
+
+        sensor = cls()
+        sensor.identifier = identifier
+        sensor.initialise_from_arrays(times, states)
+        sensor.update_attributes(attributes)
+        return sensor
+
+    def initialise_from_arrays(self, times, states):
+        self.load_arrays(as_nanoseconds(pd.to_datetime(times, utc=True)), states)
+
+    def load_arrays(self, times, states):
+        """
+        Replace the sensor's samples with sorted `times` (int64 UTC nanoseconds) and float64 `states`.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        states = np.asarray(states, dtype=np.float64)
+        if times.shape != states.shape:
+            raise ValueError("times and states must have the same length")
+        self._limit = self.capacity or times.size + self.DEFAULT_CAPACITY
+        self._times = np.array(times[-self._limit:])# own copies, so the caller's arrays can't change them
+        self._states = np.array(states[-self._limit:])
+        self._start, self._end = 0, self._times.size
+        if self._tail is not None:
+            self._tail.clear()
+        self._generation += 1
+        self._updates = 0
+        self._loaded = True
+        self._frames = {}
+        self._timestep = None
+
+    @property
+    def timeseries(self) -> pd.DataFrame:
+        """
+        The samples as a DataFrame with `time` and `state` columns.
+
+        Like `df` it is a read-only view built over the sensor's arrays when first asked for, not a copy
+        of the data, and is reused until the samples change. The arrays are never written in place: new
+        samples replace them with new arrays, so a frame already handed out is a snapshot that keeps its
+        contents and simply does not show later samples; ask for the property again to see them.
+        """
+        return self.__frame('timeseries')
+
+    def __frame(self, kind: str) -> pd.DataFrame:
+        times, states = self.__arrays()
+        version = self.data_version
+        cached = self._frames.get(kind)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        time = pd.DatetimeIndex(times.view('datetime64[ns]'), name='time').tz_localize('UTC')
+        if kind == 'df':
+            frame = pd.DataFrame({'state': states}, index=time, copy=False)
+        else:
+            frame = pd.DataFrame({'time': time, 'state': states}, copy=False)
+        self._frames[kind] = (version, frame)
+        return frame
+
+    @property
+    def data_version(self) -> tuple:
+        """
+        Changes whenever the samples change, so results derived from them can be cached against it.
+        """
+        self.__ensure_loaded()
+        return self._generation, self._updates
+
+    def get_arrays(self):
+        """
+        The sample times as int64 UTC nanoseconds and the float64 values, as read-only arrays held by the
+        sensor. This is the form the signal processing and identification code works on. Like the frames
+        they are snapshots that later updates never modify.
+        """
+        return self.__arrays()
+
+    @property
+    def x(self) -> np.ndarray:
+        """
+        The sample times as a read-only datetime64[ns] (UTC) view of the time array.
+        """
+        return self.__arrays()[0].view('datetime64[ns]')
+
+    @property
+    def y(self) -> np.ndarray:
+        """
+        The sample values as the read-only float64 state array.
+        """
+        return self.__arrays()[1]
+
     ### Virtual Sensor Methods
     #TODO: Create Virtual Sensors
 
-    def initialise_virtual_df(self):
-        # Convert self.x to datetime
-        self.x = pd.to_datetime(self.x)
-        
-        # Create a DataFrame with 'time' as the index
-        self.df = pd.DataFrame({
-            'state': self.y,
-            'time': self.x
-        })
-
-        # Perform same operations as with the real sensor
-        self.timeseries = self.df.reset_index()[['time', 'state']]
-        self.timeseries['state'] = pd.to_numeric(self.timeseries['state'], errors='coerce')
-        # Update self.x and self.y
-        self.x = np.array(self.timeseries.index)
-        self.y = np.array(self.timeseries['state'])
+    def initialise_virtual_df(self, timestamps, values):
+        # Perform same operations as with the real sensor, keeping only the arrays
+        states = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+        self.load_arrays(as_nanoseconds(pd.to_datetime(timestamps)), states)
 
 
 
-    def generate_virtual_data(self, sample_rate=None, amplitude=None, frequency=None, phase=None, noise_level=None, randomise:bool=False):
+    def generate_virtual_data(self, sample_rate=None, amplitude=None, frequency=None, phase=None, noise_level=None, randomise:bool=False, seed=None):
         # add capability for white noise
-        random.seed(0)
+        # for many sensors at once use `virtual_sensors.generate_virtual_sensors`
+        rng = np.random.default_rng(seed)
 
         if randomise:
-            sample_rate = sample_rate if sample_rate is not None else 60 + np.random.randint(-59, 6000)  # seconds with randomness
-            amplitude = amplitude if amplitude is not None else 1.0 + np.random.uniform(-0.1, 0.1)
-            frequency = frequency if frequency is not None else (1 / 86400) * (1 + np.random.uniform(-0.1, 0.1))  # daily frequency with 10% variation
-            phase = phase if phase is not None else np.random.uniform(-np.pi/4, np.pi/4)
-            noise_level = noise_level if noise_level is not None else 0.1 + np.random.uniform(-0.05, 0.05)
+            sample_rate = sample_rate if sample_rate is not None else 60 + int(rng.integers(-59, 6000))  # seconds with randomness
+            amplitude = amplitude if amplitude is not None else 1.0 + rng.uniform(-0.1, 0.1)
+            frequency = frequency if frequency is not None else (1 / 86400) * (1 + rng.uniform(-0.1, 0.1))  # daily frequency with 10% variation
+            phase = phase if phase is not None else rng.uniform(-np.pi/4, np.pi/4)
+            noise_level = noise_level if noise_level is not None else 0.1 + rng.uniform(-0.05, 0.05)
 
         else:
             #params
@@ -93,18 +321,18 @@ class Sensor(Peripheral):
         sinusoidal_data = amplitude * np.sin(2 * np.pi * frequency * t + phase)
         
         # Add noise to the data
-        noise = noise_level * np.random.randn(num_samples)
+        noise = noise_level * rng.standard_normal(num_samples)
         data_with_noise = sinusoidal_data + noise
         
         # Create a DataFrame
-        self.x = timestamps
-        self.y = data_with_noise
-        self.initialise_virtual_df()
+        self.initialise_virtual_df(timestamps, data_with_noise)
         
 
     ### Real Sensor
     def initialise_attributes_from_df(self):
-            # Extract attributes from the first non-null row in the DataFrame
+            # Extract attributes from the first non-null row in the DataFrame, if it carries them
+            if 'attributes' not in self.df:
+                return
             first_valid_index = self.df['attributes'].first_valid_index()
             if first_valid_index is not None:
                 attributes = self.df.loc[first_valid_index, 'attributes']
@@ -119,29 +347,36 @@ class Sensor(Peripheral):
         :return: The `get_latest_state` method returns the latest state from the `timeseries` data if it is
         not empty. If the `timeseries` is empty, it returns `None`.
         """
-        if not self.timeseries.empty:
-            return self.timeseries.iloc[-1]
+        self.__ensure_loaded()
+        times, states = self.window(1)# the newest live sample, without merging
+        if times.size:
+            held = self._end - self._start + (len(self._tail) if self._tail is not None else 0)
+            return pd.Series({'time': pd.Timestamp(int(times[0]), tz='UTC'), 'state': float(states[0])}, name=held - 1)
         return None        
 
     def get_timestep(self) -> float:
-        # Ensure the index is a datetime index
-        
-        if self.virtual:
-            self.df.set_index('time', inplace=True)
-            
-        
-        time_diffs = self.df.index.to_series().diff() # get the difference between sample times
-        rounded_interval = time_diffs.mode()[0]# find most common time interval
-        common_interval_seconds = round(rounded_interval.total_seconds()) # find the most common and round
-        return common_interval_seconds
+        """
+        The typical sample interval of the sensor in seconds, estimated once with
+        `resampling.estimate_interval` and cached until the samples are replaced. Live updates don't
+        re-estimate it, which would read the whole history on every sample.
+
+        :raises ValueError: if the sensor has fewer than two distinct sample times, so it has no timestep
+        """
+        if self._timestep is None:
+            timestep = estimate_interval(self.__arrays()[0])
+            if timestep is None:
+                raise ValueError(f"Sensor {self.identifier} needs at least two distinct sample times to have a timestep")
+            self._timestep = timestep
+        return self._timestep
 
     def update_attributes(self, attributes):
+            self.attributes.update(attributes)
             for key, value in attributes.items():
                 setattr(self, key, value)
 
     def get_attributes(self):
         # return the attributes gathered from the database
-        return NotImplementedError
+        return self.attributes
     
     def get_timeseries(self, numpy=False):
         """
@@ -163,8 +398,24 @@ class Sensor(Peripheral):
         else:
             return self.y# returns a 1d numpy array of the sensor values
 
-    def get_state_at_time(self, time):
-        pass
+    def get_state_at_time(self, time, method='zoh'):
+        """
+        The sensor's value at `time`, a single time or an array of times (naive times are taken as UTC),
+        found by binary search on the sample times rather than by scanning the DataFrame.
+
+        :param method: 'zoh' holds the most recent sample, 'linear' interpolates between the samples
+            either side
+        :return: a float for a single time, otherwise an array of floats; NaN before the first sample
+            (and after the last one for 'linear')
+        """
+        self.__ensure_loaded()
+        if self._tail is not None and len(self._tail):# recent times are answered from the live tail alone
+            times, states = self._tail.window()
+            query = as_nanoseconds(time)
+            if query.size and np.min(query) >= times[0]:
+                return sample_at(times, states, time, method)
+        times, states = self.__arrays()
+        return sample_at(times, states, time, method)
 
     def plot(self):
         self.timeseries.plot('time', 'state')
@@ -172,8 +423,22 @@ class Sensor(Peripheral):
 
     #TODO: does this need to be an async function because it will need to be able to handle the websocket data?
     def update_series(self, time, state, location=None):
-        new_entry = pd.DataFrame({'time': [time], 'state': [state], 'location': [location]})
-        self.timeseries = pd.concat([self.timeseries, new_entry], ignore_index=True)
+        """
+        Append a new reading in O(1) to the live tail. `time` may be anything `pd.Timestamp` accepts (naive
+        times are taken as UTC) and `state` is converted to float, with non-numeric states stored as NaN.
+        `location` is not stored.
+        """
+        time = pd.Timestamp(time)
+        if time.tzinfo is not None:
+            time = time.tz_convert('UTC').tz_localize(None)
+        state = pd.to_numeric(state, errors='coerce')
+        self.__ensure_loaded()
+        if self._tail is None:
+            self._tail = RingBuffer(self.TAIL_CAPACITY)
+        elif len(self._tail) == self._tail.capacity:
+            self.__merge_tail()
+        self._tail.append(time.as_unit('ns').value, np.nan if state is None else float(state))
+        self._updates += 1
 
     def __str__(self):
         latest_state = self.get_latest_state()
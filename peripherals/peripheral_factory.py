@@ -1,11 +1,45 @@
-from Sensor import Sensor
-from Actuator import Actuator
+from peripherals.Sensor import Sensor
+from peripherals.Actuator import Actuator
 import re
 
-def peripheral_factory(dbmanager, identifier):
+def peripheral_factory(dbmanager, identifier, start=None, end=None, lazy=False, bucket=None, resample='zoh', interval=None):
+    options = {'start': start, 'end': end, 'bucket': bucket, 'resample': resample, 'interval': interval, 'lazy': lazy}
     if re.match(r'^sensor\.', identifier):
-        return Sensor(dbmanager=dbmanager, identifier=identifier)
+        return Sensor(dbmanager=dbmanager, identifier=identifier, **options)
     elif re.match(r'^switch\.', identifier):
-        return Actuator(dbmanager=dbmanager, identifier=identifier)
+        return Actuator(dbmanager=dbmanager, identifier=identifier, **options)
     else:
-        raise ValueError("Unknown device type")
\ No newline at end of file
+        raise ValueError("Unknown device type")
+
+def peripherals_factory(dbmanager, identifiers, start=None, end=None, lazy=False, bucket=None, resample='zoh', interval=None):
+    """
+    Build several peripherals from one bulk `get_timeseries_many` query instead of one query each.
+    Returns the peripherals in the same order as `identifiers`. With `lazy=True` only the attributes
+    are fetched now and each peripheral loads its own history on first access.
+
+    The histories are put on an `interval` grid with the same `resample` strategy that `get_timeseries`
+    applies, so the peripherals hold the same samples as those built one at a time by
+    `peripheral_factory`. Bucketed histories are aggregated in the database, which the bulk query
+    can't do, so with a `bucket` each peripheral loads its own.
+    """
+    for identifier in identifiers:
+        if not re.match(r'^(sensor|switch)\.', identifier):
+            raise ValueError(f"Unknown device type: {identifier}")
+
+    attributes = dbmanager.get_attributes_many(identifiers)
+    if lazy or bucket is not None:
+        return [
+            (Sensor if identifier.startswith('sensor.') else Actuator)(dbmanager=dbmanager, identifier=identifier, start=start, end=end, bucket=bucket, resample=resample, interval=interval, lazy=lazy, **attributes[identifier])
+            for identifier in identifiers
+        ]
+
+    timeseries = dbmanager.get_timeseries_many(identifiers, start=start, end=end, resample=resample, interval=interval)
+
+    peripherals = []
+    for identifier in identifiers:
+        times, states = timeseries[identifier]
+        if identifier.startswith('sensor.'):
+            peripherals.append(Sensor.from_arrays(times, states, identifier=identifier, **attributes[identifier]))
+        else:
+            peripherals.append(Actuator.from_arrays(times, states, identifier=identifier, **attributes[identifier]))
+    return peripherals
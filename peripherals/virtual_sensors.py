@@ -0,0 +1,76 @@
+"""
+Generate many synthetic sensors at once, for testing and benchmarking the alignment, identification and
+filtering code at realistic sizes without a database.
+"""
+import numpy as np
+import pandas as pd
+
+from peripherals.Sensor import Sensor
+
+
+def generate_virtual_sensors(n: int, duration: float=14 * 86400, sample_rate=60, irregularity: float=0.0, dropout: float=0.0,
+                             amplitude: float=1.0, period: float=86400, noise_level: float=0.1, drift: float=0.0,
+                             steps: int=0, step_size: float=1.0, start=None, seed=None) -> list:
+    """
+    Generate `n` array-backed virtual sensors in one vectorised pass. Every sensor is a sine wave with a
+    random phase plus Gaussian noise, optionally with a linear drift and random step changes. The rows are
+    generated end to end in one flat array, each sized for its own sample rate, so sensors with different
+    rates don't pad each other out.
+
+    :param n: number of sensors
+    :param duration: length of every series in seconds, two weeks by default
+    :param sample_rate: seconds between samples, either one value or one per sensor
+    :param irregularity: each interval is scaled by a uniform factor in `[1 - irregularity, 1 + irregularity]`,
+        0 gives a regular grid
+    :param dropout: probability of each sample being missing
+    :param amplitude: amplitude of the sine wave
+    :param period: period of the sine wave in seconds, a day by default
+    :param noise_level: standard deviation of the noise
+    :param drift: largest drift in units per day; each sensor draws its drift uniformly from `[-drift, drift]`
+    :param steps: number of step changes per sensor, at uniformly random times
+    :param step_size: standard deviation of the step heights
+    :param start: time of the first sample, 2024-01-01 UTC by default so runs are reproducible
+    :param seed: seed for the `np.random.Generator`, None for a random seed
+    :return: a list of `Sensor`s named `sensor.virtual_<i>`
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01', tz='UTC') if start is None else pd.Timestamp(start)
+    if start.tzinfo is None:
+        start = start.tz_localize('UTC')
+    irregularity = min(max(irregularity, 0.0), 0.99)# intervals must stay positive
+
+    sample_rate = np.broadcast_to(np.asarray(sample_rate, dtype=np.float64), (n,))
+
+    # every row gets the samples its own rate needs, plus a margin for the jitter of its intervals: the
+    # time after k jittered intervals has a standard deviation of about irregularity * sqrt(k / 3) intervals
+    counts = np.ceil(duration / sample_rate).astype(np.int64)
+    if irregularity > 0:
+        counts += np.ceil(5 * irregularity * np.sqrt(counts / 3)).astype(np.int64) + 1
+    row = np.repeat(np.arange(n), counts)# all rows laid end to end in one flat array, without padding
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))# index of each row's first sample
+
+    intervals = sample_rate[row]
+    if irregularity > 0:
+        intervals = intervals * rng.uniform(1 - irregularity, 1 + irregularity, size=row.size)
+    elapsed = np.cumsum(intervals) - intervals# running total before each sample
+    t = elapsed - elapsed[first][row]# seconds since the start of its row, first sample at 0
+    keep = t < duration
+    if dropout > 0:
+        keep &= rng.random(row.size) >= dropout
+
+    phase = rng.uniform(-np.pi, np.pi, size=n)
+    values = amplitude * np.sin(2 * np.pi * t / period + phase[row])
+    values += noise_level * rng.standard_normal(row.size)
+    if drift:
+        values += rng.uniform(-drift, drift, size=n)[row] * t / 86400
+    for k in range(steps):# loops over steps, not samples
+        step_times = rng.uniform(0, duration, size=n)
+        values += rng.normal(0, step_size, size=n)[row] * (t >= step_times[row])
+
+    times = start.value + np.round(t[keep] * 1e9).astype(np.int64)
+    values = values[keep]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(row[keep], minlength=n))))
+    return [
+        Sensor.from_arrays(times[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]], identifier=f"sensor.virtual_{i}")
+        for i in range(n)
+    ]
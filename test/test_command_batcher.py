@@ -0,0 +1,91 @@
+import asyncio
+import time
+import unittest
+
+from data_management.CommandBatcher import CommandBatcher
+from data_management.EntityState import EntityState
+
+
+class FakeDataManager:
+    """
+    Records service calls; calls to entities in `slow` never complete.
+    """
+
+    def __init__(self, states=None, slow=()):
+        self.states = states or {}
+        self.mirroring = bool(states)
+        self.slow = set(slow)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def call_service(self, domain, service, service_data=None, target=None, timeout=None):
+        self.calls.append((domain, service, service_data, target["entity_id"]))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if target["entity_id"] in self.slow:
+                await asyncio.Event().wait()
+            await asyncio.sleep(0.01)
+            return {"context": {"id": target["entity_id"]}}
+        finally:
+            self.in_flight -= 1
+
+
+class TestCommandBatcher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_flush_sends_concurrently(self):
+        datamanager = FakeDataManager()
+        batcher = CommandBatcher(datamanager)
+        batcher.queue("switch.a", "turn_on")
+        batcher.queue("switch.b", "turn_off")
+        batcher.queue("switch.a", "turn_off")# replaces the first command
+
+        results = await batcher.flush()
+        self.assertEqual(sorted(datamanager.calls), [("switch", "turn_off", None, "switch.a"), ("switch", "turn_off", None, "switch.b")])
+        self.assertEqual(datamanager.max_in_flight, 2)
+        self.assertEqual(results["switch.a"], {"context": {"id": "switch.a"}})
+        self.assertEqual(batcher.pending, {})
+
+    async def test_skip_unchanged(self):
+        datamanager = FakeDataManager(states={"switch.a": EntityState("switch.a", "on")})
+        batcher = CommandBatcher(datamanager)
+        batcher.queue("switch.a", "turn_on")# already on according to the mirror
+        batcher.queue("switch.b", "turn_on")
+        results = await batcher.flush()
+        self.assertIsNone(results["switch.a"])
+        self.assertEqual([call[3] for call in datamanager.calls], ["switch.b"])
+
+        batcher.queue("switch.b", "turn_on")# already commanded on
+        self.assertEqual(await batcher.flush(), {"switch.b": None})
+        self.assertEqual(len(datamanager.calls), 1)
+
+    async def test_quick_reversal_with_stale_mirror(self):
+        datamanager = FakeDataManager(states={"switch.a": EntityState("switch.a", "off", time.time() - 60)})
+        batcher = CommandBatcher(datamanager)
+        batcher.queue("switch.a", "turn_on")
+        await batcher.flush()
+
+        # the mirror still shows "off" because HAOS' state_changed event has not arrived yet
+        batcher.queue("switch.a", "turn_off")
+        await batcher.flush()
+        self.assertEqual([call[1] for call in datamanager.calls], ["turn_on", "turn_off"])
+
+        # once the mirror reports a later update, it is trusted again
+        datamanager.states["switch.a"] = EntityState("switch.a", "off", time.time() + 1)
+        batcher.queue("switch.a", "turn_off")
+        self.assertEqual(await batcher.flush(), {"switch.a": None})
+
+    async def test_timeout(self):
+        datamanager = FakeDataManager(slow=["switch.a"])
+        batcher = CommandBatcher(datamanager, timeout=0.05)
+        batcher.queue("switch.a", "turn_on")
+        batcher.queue("switch.b", "turn_on")
+        results = await batcher.flush()
+        self.assertIsInstance(results["switch.a"], asyncio.TimeoutError)
+        self.assertNotIn("switch.a", batcher.last_commanded)
+        self.assertEqual(batcher.last_commanded["switch.b"], "on")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from control.IIRFilter import IIRFilter
+from peripherals.Sensor import Sensor
+
+
+class TestIIRFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.default_rng(0).standard_normal((500, 3))
+
+    def test_chunks_match_whole_series(self):
+        whole = IIRFilter.lowpass(0.05, fs=1.0, order=8, channels=3).filter(self.data)
+
+        stream = IIRFilter.lowpass(0.05, fs=1.0, order=8, channels=3)
+        chunks = [stream.filter(self.data[:100])]
+        chunks += [stream.step(sample)[None, :] for sample in self.data[100:110]]
+        chunks.append(stream.filter(self.data[110:]))
+        np.testing.assert_allclose(np.vstack(chunks), whole)
+
+        sos = butter(8, 0.05, fs=1.0, output='sos')
+        expected, _ = sosfilt(sos, self.data, axis=0, zi=sosfilt_zi(sos)[:, :, None] * self.data[0])
+        np.testing.assert_allclose(whole, expected)
+
+    def test_single_channel(self):
+        highpass = IIRFilter.highpass(0.1, fs=1.0)
+        np.testing.assert_allclose(highpass.filter(np.full(50, 3.0)), 0, atol=1e-12)# a constant is removed
+        self.assertIsInstance(highpass.step(3.0), float)
+
+        bandpass = IIRFilter.bandpass(0.05, 0.2, fs=1.0)
+        self.assertEqual(bandpass.filter(self.data[:, 0]).shape, (500,))
+        with self.assertRaises(ValueError):
+            bandpass.filter(self.data)
+
+    def test_reset(self):
+        lowpass = IIRFilter.lowpass(0.05, fs=1.0)
+        first = lowpass.filter(self.data[:, 0])
+        lowpass.reset()
+        np.testing.assert_allclose(lowpass.filter(self.data[:, 0]), first)
+        with self.assertRaises(ValueError):
+            IIRFilter(0.05, fs=1.0, btype='notch')
+
+    def test_for_sensor(self):
+        sensor = Sensor.from_arrays(np.arange(10, dtype=np.int64) * 500_000_000, np.zeros(10))# 2 Hz
+        live = IIRFilter.for_sensor(sensor, 0.5, channels=3, steady_state=False)
+        np.testing.assert_allclose(live.sos, butter(5, 0.5, fs=2.0, output='sos'))
+        self.assertEqual(live.filter(self.data).shape, (500, 3))
+        self.assertFalse(IIRFilter.highpass(0.1, fs=1.0, steady_state=False).steady_state)
+
+        with self.assertRaises(ValueError):
+            IIRFilter.for_sensor(Sensor.from_arrays(np.array([0]), np.array([1.0])), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
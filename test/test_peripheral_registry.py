@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from peripherals.PeripheralRegistry import PeripheralRegistry
+
+
+class FakeDatabaseManager:
+    """
+    Serves the same short history for every entity and counts the queries made.
+    """
+
+    def __init__(self):
+        self.queries = 0
+
+    def get_timeseries(self, identifier, **query):
+        self.queries += 1
+        self.query = query
+        if identifier.startswith("switch."):# raw ltss states, as get_timeseries returns them
+            index = pd.date_range("1970-01-01", periods=4, freq="1min", tz="UTC", name="time")
+            return pd.DataFrame({"state": ["on", "off", "unavailable", "on"]}, index=index)
+        index = pd.date_range("2024-01-01", periods=3, freq="1min", tz="UTC", name="time")
+        return pd.DataFrame({"state": [1.0, 2.0, 3.0]}, index=index)
+
+    def get_attributes(self, identifier):
+        return {"friendly_name": identifier}
+
+    def get_timeseries_many(self, identifiers, start=None, end=None, resample=None, interval=None):
+        self.queries += 1
+        self.resample = resample
+        self.interval = interval
+        times = np.array([0, 60, 120], dtype=np.int64) * 1_000_000_000
+        series = {identifier: (times, np.array([1.0, 2.0, 3.0])) for identifier in identifiers}
+        for identifier in identifiers:
+            if identifier.startswith("switch."):# cast in the database, 'unavailable' rows dropped
+                series[identifier] = (np.array([0, 60, 180], dtype=np.int64) * 1_000_000_000, np.array([1.0, 0.0, 1.0]))
+        return series
+
+    def get_attributes_many(self, identifiers):
+        return {identifier: {"friendly_name": identifier} for identifier in identifiers}
+
+
+class TestPeripheralRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.dbmanager = FakeDatabaseManager()
+        self.registry = PeripheralRegistry(self.dbmanager)
+
+    def test_shared_instances(self):
+        first = self.registry.get("sensor.a")
+        self.assertIs(self.registry.get("sensor.a"), first)
+        self.assertIsNot(self.registry.get("sensor.a", start="2024-01-01"), first)# another window
+        self.assertEqual(self.dbmanager.queries, 2)
+
+        a, b = self.registry.get_many(["sensor.a", "sensor.b"])
+        self.assertIs(a, first)
+        self.assertEqual(self.dbmanager.queries, 3)# only sensor.b was loaded, in one bulk query
+        self.assertEqual(self.dbmanager.resample, 'zoh')# resampled like get_timeseries, as get does
+        self.assertIs(self.registry.get("sensor.b"), b)
+
+    def test_load_options(self):
+        averaged = self.registry.get("sensor.a", resample="mean", interval="1min")
+        self.assertEqual(self.dbmanager.query["resample"], "mean")
+        self.assertIs(self.registry.get("sensor.a", resample="mean", interval=60), averaged)# same interval, same key
+        self.assertIsNot(self.registry.get("sensor.a"), averaged)
+
+        self.registry.get_many(["sensor.b"], resample="mean", interval="5min")
+        self.assertEqual((self.dbmanager.resample, self.dbmanager.interval), ("mean", "5min"))
+
+        bucketed, = self.registry.get_many(["sensor.c"], bucket="15min")# aggregated in the database, one query each
+        self.assertEqual(self.dbmanager.query["bucket"], "15min")
+        self.assertIs(self.registry.get("sensor.c", bucket="15min"), bucketed)
+
+    def test_actuator_states_match(self):
+        single = self.registry.get("switch.a")
+        bulk, = self.registry.get_many(["switch.b"])
+        query = pd.to_datetime([0, 30, 90, 150, 200], unit="s", utc=True)
+        np.testing.assert_array_equal(single.get_state_at_time(query), [1.0, 1.0, 0.0, 0.0, 1.0])
+        np.testing.assert_array_equal(single.get_state_at_time(query), bulk.get_state_at_time(query))
+        np.testing.assert_array_equal(single.get_arrays()[0], bulk.get_arrays()[0])
+
+    def test_memory_budget(self):
+        self.registry.memory_budget = self.registry.get("sensor.a").memory_usage()
+        self.registry.get("sensor.b")
+        self.registry.get("sensor.c")
+        self.assertEqual([key[0] for key in self.registry.peripherals], ["sensor.c"])
+        self.assertLessEqual(self.registry.memory_usage(), self.registry.memory_budget)
+
+    def test_invalidate(self):
+        live = self.registry.get("sensor.a")
+        past = self.registry.get("sensor.a", end="2024-01-02")
+        self.registry.invalidate("sensor.a", time="2025-01-01")
+        self.assertIs(self.registry.get("sensor.a", end="2024-01-02"), past)# closed window still valid
+        self.assertIsNot(self.registry.get("sensor.a"), live)
+
+    def test_follow(self):
+        async def updates():
+            yield "sensor.a", None
+
+        self.registry.get("sensor.a")
+        self.registry.get("sensor.b")
+        asyncio.run(self.registry.follow(updates()))
+        self.assertEqual([key[0] for key in self.registry.peripherals], ["sensor.b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from data_management.DatabaseManager import DatabaseManager
+from data_management.resampling import align, as_nanoseconds, estimate_interval, resample, sample_at, time_weighted_mean
+
+
+class TestEstimateInterval(unittest.TestCase):
+
+    def test_regular(self):
+        times = np.arange(0, 600, 30, dtype=np.int64) * 1_000_000_000
+        self.assertEqual(estimate_interval(times), 30)
+
+    def test_sub_second(self):
+        times = pd.date_range("2024-01-01", periods=50, freq="200ms", tz="UTC")
+        self.assertAlmostEqual(estimate_interval(times), 0.2)
+
+    def test_irregular_with_bursts(self):
+        rng = np.random.default_rng(0)
+        times = np.cumsum(rng.normal(60, 2, 1000)).astype(np.int64) * 1_000_000_000
+        times = np.sort(np.concatenate([times, times[::10] + 1_000_000]))# bursts of near-duplicate updates
+        self.assertAlmostEqual(estimate_interval(times, resolution=1), 60, delta=2)
+
+    def test_degenerate(self):
+        self.assertIsNone(estimate_interval(np.array([5, 5, 5], dtype=np.int64)))
+        self.assertIsNone(estimate_interval(np.array([], dtype=np.int64)))
+
+    def test_as_nanoseconds(self):
+        index = pd.date_range("2024-01-01", periods=3, freq="1s", tz="UTC").as_unit("ns")
+        np.testing.assert_array_equal(as_nanoseconds(index), index.asi8)
+        np.testing.assert_array_equal(as_nanoseconds(index.values), index.asi8)
+        np.testing.assert_array_equal(as_nanoseconds(pd.Series(index)), index.asi8)
+
+
+class TestResample(unittest.TestCase):
+
+    def setUp(self):
+        # a change-only sensor: 1 from t=0s, 3 from t=10s, 5 from t=30s
+        self.times = np.array([0, 10, 30], dtype=np.int64) * 1_000_000_000
+        self.values = np.array([1.0, 3.0, 5.0])
+
+    def test_zero_order_hold(self):
+        grid, values = resample(self.times, self.values, 10, method='zoh')
+        np.testing.assert_array_equal(grid, np.arange(0, 40, 10) * 1_000_000_000)
+        np.testing.assert_array_equal(values, [1, 3, 3, 5])
+
+    def test_time_weighted_mean(self):
+        grid, values = resample(self.times, self.values, 20, method='mean')
+        np.testing.assert_array_equal(grid, [0, 20_000_000_000])
+        np.testing.assert_allclose(values, [2, 4])
+
+    def test_last_per_bucket(self):
+        grid, values = resample(self.times, self.values, 20, method='last')
+        np.testing.assert_array_equal(values, [3, 5])
+
+    def test_sparse_does_not_expand(self):
+        # two samples a year apart resampled hourly only produce the hourly grid
+        times = np.array([0, 365 * 86400], dtype=np.int64) * 1_000_000_000
+        grid, values = resample(times, [0.0, 1.0], 3600, method='mean')
+        self.assertEqual(grid.size, 365 * 24 + 1)
+        self.assertTrue(np.all(values[:-1] == 0))
+
+    def test_mean_matches_pandas_on_dense_grid(self):
+        rng = np.random.default_rng(1)
+        times = np.sort(rng.choice(3600, 200, replace=False)).astype(np.int64) * 1_000_000_000
+        values = rng.normal(size=200)
+        starts = np.arange(times[0] // 60_000_000_000 + 1, 59) * 60_000_000_000
+
+        dense = pd.Series(values, index=pd.to_datetime(times)).resample('1s').ffill()
+        expected = dense.resample('60s').mean().reindex(pd.to_datetime(starts)).to_numpy()
+        np.testing.assert_allclose(time_weighted_mean(times, values, starts, 60), expected)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            resample(self.times, self.values, 10, method='cubic')
+
+    def test_arrays_match_frames(self):
+        # the bulk array path must give a sensor the same samples as get_timeseries followed by Sensor.load
+        times = np.array([0, 7, 10, 31, 45], dtype=np.int64) * 1_000_000_000
+        raw = ['1', '2', 'unavailable', '4', '5']
+        df = pd.DataFrame({'state': raw}, index=pd.DatetimeIndex(pd.to_datetime(times, utc=True), name='time'))
+        frame = DatabaseManager._resample_timeseries(None, df)
+        frame_states = pd.to_numeric(frame['state'], errors='coerce').to_numpy(dtype=np.float64)
+
+        grid, states = DatabaseManager._resample_arrays(times, pd.to_numeric(pd.Series(raw), errors='coerce').to_numpy())
+        np.testing.assert_array_equal(grid, as_nanoseconds(frame.index))
+        np.testing.assert_array_equal(states, frame_states)
+
+
+class TestSampleAt(unittest.TestCase):
+
+    def setUp(self):
+        self.times = np.array([0, 10, 20], dtype=np.int64) * 1_000_000_000
+        self.values = np.array([1.0, 3.0, 2.0])
+
+    def test_zoh(self):
+        query = np.array([-1, 0, 15, 25], dtype=np.int64) * 1_000_000_000
+        np.testing.assert_array_equal(sample_at(self.times, self.values, query), [np.nan, 1.0, 3.0, 2.0])
+
+    def test_linear(self):
+        query = np.array([[5, 15], [20, 30]], dtype=np.int64) * 1_000_000_000
+        np.testing.assert_array_equal(sample_at(self.times, self.values, query, 'linear'), [[2.0, 2.5], [2.0, np.nan]])
+
+    def test_scalar_timestamp(self):
+        self.assertEqual(sample_at(self.times, self.values, pd.Timestamp("1970-01-01 00:00:12", tz="UTC")), 3.0)
+        self.assertEqual(sample_at(self.times, self.values, "1970-01-01T00:00:05", method='linear'), 2.0)
+        with self.assertRaises(ValueError):
+            sample_at(self.times, self.values, 0, method='cubic')
+
+
+class TestAlign(unittest.TestCase):
+
+    def test_common_grid(self):
+        seconds = 1_000_000_000
+        fast = (np.arange(0, 100, 10) * seconds, np.arange(0, 100, 10, dtype=np.float64))
+        slow = (np.array([5, 35, 65, 95]) * seconds, np.array([0.0, 3.0, np.nan, 9.0]))
+        grid, values = align([fast, slow])
+        np.testing.assert_array_equal(grid, np.arange(10, 100, 10) * seconds)# overlap only, finest interval
+        self.assertEqual(values.shape, (9, 2))
+        np.testing.assert_allclose(values[:, 0], np.arange(10, 100, 10))
+        np.testing.assert_allclose(values[:2, 1], [0.5, 1.5])
+        np.testing.assert_allclose(values[-1, 1], 8.5)# interpolated across the NaN sample
+
+    def test_zoh_and_window(self):
+        channel = (np.array([0, 2, 4], dtype=np.int64) * 1_000_000_000, [1.0, 2.0, 3.0])
+        grid, values = align([channel], interval=1, method='zoh', start=np.datetime64(1, 's'), dtype=np.float32)
+        np.testing.assert_array_equal(values[:, 0], [1.0, 2.0, 2.0, 3.0])
+        self.assertEqual(values.dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from data_management.RingBuffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def test_append_wraps(self):
+        buffer = RingBuffer(3)
+        for i in range(5):
+            buffer.append(i, i * 10.0)
+        times, states = buffer.window()
+        np.testing.assert_array_equal(times, [2, 3, 4])
+        np.testing.assert_array_equal(states, [20.0, 30.0, 40.0])
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.version, 5)
+        self.assertEqual(buffer.latest(), (4, 40.0))
+
+    def test_window_is_a_view(self):
+        buffer = RingBuffer(4)
+        buffer.extend(np.arange(6), np.arange(6, dtype=np.float64))
+        times, states = buffer.window(2)
+        np.testing.assert_array_equal(times, [4, 5])
+        self.assertTrue(np.shares_memory(states, buffer._states))
+        with self.assertRaises(ValueError):
+            states[0] = 1.0
+
+    def test_extend_then_append(self):
+        buffer = RingBuffer(5)
+        buffer.extend([1, 2, 3], [1.0, 2.0, 3.0])
+        buffer.append(4, 4.0)
+        buffer.extend([5, 6], [5.0, 6.0])
+        np.testing.assert_array_equal(buffer.window()[0], [2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(buffer.window(10)[1], [2.0, 3.0, 4.0, 5.0, 6.0])
+        buffer.clear()
+        self.assertEqual(buffer.window()[0].size, 0)
+        self.assertIsNone(buffer.latest())
+
+
+if __name__ == '__main__':
+    unittest.main()
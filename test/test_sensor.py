@@ -45,4 +45,143 @@
 #     #     pass
 
 # if __name__ == '__main__':
-#     unittest.main()
\ No newline at end of file
+#     unittest.main()
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from peripherals.Sensor import Sensor
+
+
+class TestVirtualSensor(unittest.TestCase):
+
+    def test_timestep_matches_sample_rate(self):
+        for sample_rate in (30, 600):
+            sensor = Sensor(virtual=True)
+            sensor.generate_virtual_data(sample_rate=sample_rate, randomise=False)
+            self.assertEqual(sensor.get_timestep(), sample_rate)
+
+    def test_timestep_from_arrays(self):
+        times = np.cumsum(np.full(100, 250_000_000, dtype=np.int64))# 4 Hz
+        sensor = Sensor.from_arrays(times, np.zeros(100))
+        self.assertAlmostEqual(sensor.get_timestep(), 0.25)
+
+    def test_timestep_needs_two_sample_times(self):
+        for times in ([], [0], [0, 0]):
+            sensor = Sensor.from_arrays(np.array(times, dtype=np.int64), np.zeros(len(times)))
+            with self.assertRaises(ValueError):
+                sensor.get_timestep()
+
+    def test_frames_are_views(self):
+        sensor = Sensor.from_arrays(np.array([0, 1_000_000_000]), np.array([1.0, 2.0]))
+        times, states = sensor.get_arrays()
+        self.assertTrue(np.shares_memory(sensor.df['state'].to_numpy(), states))
+        self.assertEqual(list(sensor.timeseries.columns), ['time', 'state'])
+        self.assertEqual(sensor.df.index[1], pd.Timestamp(1, unit='s', tz='UTC'))
+
+    def test_update_series(self):
+        sensor = Sensor.from_arrays(np.array([0, 1_000_000_000]), np.array([1.0, 2.0]))
+        sensor.update_series(pd.Timestamp(2, unit='s', tz='UTC'), "3.5")
+        sensor.update_series(pd.Timestamp(3, unit='s'), "unavailable")
+        self.assertEqual(len(sensor.timeseries), 4)
+        np.testing.assert_array_equal(sensor.y, [1.0, 2.0, 3.5, np.nan])
+        self.assertEqual(sensor.x[-1], np.datetime64(3, 's'))
+        self.assertEqual(sensor.get_latest_state()['time'], pd.Timestamp(3, unit='s', tz='UTC'))
+
+    def test_frames_are_snapshots(self):
+        sensor = Sensor.from_arrays(np.array([0, 1_000_000_000]), np.array([1.0, 2.0]))
+        held = sensor.timeseries
+        times, states = sensor.get_arrays()
+        for i in range(2, 2 * Sensor.TAIL_CAPACITY + 2):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), -1.0)
+            sensor.get_arrays()# merges the tail on every read
+        self.assertEqual(held['state'].tolist(), [1.0, 2.0])
+        np.testing.assert_array_equal(states, [1.0, 2.0])
+        self.assertEqual(len(sensor.timeseries), 2 * Sensor.TAIL_CAPACITY + 2)
+
+    def test_history_held_once(self):
+        sensor = Sensor.from_arrays(np.arange(1000, dtype=np.int64), np.zeros(1000))
+        self.assertEqual(sensor.memory_usage(), 1000 * 16)# one int64 and one float64 per sample, no live tail yet
+
+    def test_live_tail_merged_and_trimmed(self):
+        sensor = Sensor(capacity=3000)
+        n = 2 * Sensor.TAIL_CAPACITY + 10
+        for i in range(n):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), i)
+        np.testing.assert_array_equal(sensor.y, np.arange(n))
+        self.assertEqual(sensor.get_latest_state()['state'], n - 1)
+
+        for i in range(n, 4000):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), i)
+        np.testing.assert_array_equal(sensor.y, np.arange(1000, 4000))# the oldest samples past the capacity are dropped
+
+    def test_recent_reads_served_from_tail(self):
+        sensor = Sensor.from_arrays(np.arange(1000) * 10**9, np.arange(1000.0))
+        for i in range(1000, 1010):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), i)
+        version = sensor.data_version
+        held = sensor.memory_usage()
+
+        times, states = sensor.window(5)
+        np.testing.assert_array_equal(states, np.arange(1005, 1010))
+        self.assertEqual(sensor.get_state_at_time(pd.Timestamp(1007.5, unit='s', tz='UTC')), 1007)
+        self.assertEqual(sensor.memory_usage(), held)# nothing was merged into the history
+        self.assertEqual(sensor.data_version, version)
+
+        times, states = sensor.window(20)# reaching past the tail merges it
+        np.testing.assert_array_equal(states, np.arange(990, 1010))
+        self.assertEqual(sensor.get_state_at_time(pd.Timestamp(500, unit='s', tz='UTC')), 500)
+
+    def test_merge_appends_into_spare_space(self):
+        sensor = Sensor()
+        for i in range(Sensor.TAIL_CAPACITY + 1):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), i)
+        first = sensor.y
+        for i in range(Sensor.TAIL_CAPACITY + 1, Sensor.TAIL_CAPACITY + 10):
+            sensor.update_series(pd.Timestamp(i, unit='s', tz='UTC'), i)
+        self.assertTrue(np.shares_memory(first, sensor.y))# the history wasn't copied again
+        np.testing.assert_array_equal(first, np.arange(Sensor.TAIL_CAPACITY + 1))
+
+
+class FakeDatabaseManager:
+    """
+    Serves a fixed history and counts the timeseries queries made.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def get_timeseries(self, identifier, **query):
+        self.queries.append(query)
+        index = pd.date_range("2024-01-01", periods=5, freq="1min", tz="UTC", name="time")
+        return pd.DataFrame({"state": ["1.0", "2.0", "unknown", "4.0", "5.0"]}, index=index)
+
+    def get_attributes(self, identifier):
+        return {"unit_of_measurement": "°C"}
+
+
+class TestLazySensor(unittest.TestCase):
+
+    def test_history_loaded_on_first_access(self):
+        dbmanager = FakeDatabaseManager()
+        sensor = Sensor(dbmanager=dbmanager, identifier="sensor.temperature", lazy=True)
+        self.assertFalse(sensor.loaded)
+        self.assertEqual(sensor.unit_of_measurement, "°C")
+        self.assertEqual(dbmanager.queries, [])
+
+        self.assertEqual(sensor.get_timestep(), 60)
+        np.testing.assert_array_equal(sensor.y, [1.0, 2.0, 4.0, 5.0])
+        self.assertEqual(len(dbmanager.queries), 1)# cached after the first access
+
+    def test_load_window(self):
+        dbmanager = FakeDatabaseManager()
+        sensor = Sensor(dbmanager=dbmanager, identifier="sensor.temperature", start="2024-01-01", lazy=True)
+        sensor.load(end="2024-01-02")
+        self.assertEqual(dbmanager.queries[0]["start"], "2024-01-01")
+        self.assertEqual(dbmanager.queries[0]["end"], "2024-01-02")
+        self.assertTrue(sensor.loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
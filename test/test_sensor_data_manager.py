@@ -0,0 +1,226 @@
+import asyncio
+from datetime import datetime, timezone
+import json
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from data_management.EntityState import EntityState
+from data_management.SensorDataManager import SensorDataManager
+
+
+class FakeConnection:
+    """
+    Stands in for the websocket: replies to each sent command through `handler`, which returns the
+    messages the server would push back.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def send(self, raw):
+        message = json.loads(raw)
+        self.sent.append(message)
+        for reply in self.handler(message):
+            self.incoming.put_nowait(json.dumps(reply))
+
+    def push(self, message):
+        self.incoming.put_nowait(json.dumps(message))
+
+    async def recv(self):
+        return await self.incoming.get()
+
+    async def close(self):
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raw = await self.incoming.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+
+def result(message, payload=None):
+    return {"id": message["id"], "type": "result", "success": True, "result": payload}
+
+
+class TestSensorDataManager(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.manager = SensorDataManager(auth_token="token", websocket_url="ws://test")
+        self.handler = lambda message: [result(message)]
+        self.manager.connection = FakeConnection(lambda message: self.handler(message))
+        self.manager._reader_task = asyncio.create_task(self.manager._SensorDataManager__reader())
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+
+    async def test_concurrent_requests(self):
+        # answer requests in reverse order to check replies are routed by id, not by arrival
+        held = []
+
+        def handler(message):
+            held.append(message)
+            if len(held) < 3:
+                return []
+            return [result(m, m["type"]) for m in reversed(held)]
+
+        self.handler = handler
+        replies = await asyncio.gather(
+            self.manager.fetch_config(), self.manager.fetch_all_services(), self.manager.fetch_panels()
+        )
+        self.assertEqual(replies, ["get_config", "get_services", "get_panels"])
+
+    async def test_events_routed_to_subscription(self):
+        events = self.manager.subscribe_events("state_changed", entity_ids=["sensor.a"])
+        first = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        subscription_id = self.manager.connection.sent[-1]["id"]
+
+        self.manager.connection.push({"id": subscription_id, "type": "event", "event": {"data": {"entity_id": "sensor.b"}}})
+        self.manager.connection.push({"id": subscription_id, "type": "event", "event": {"data": {"entity_id": "sensor.a"}}})
+        states = await self.manager.fetch_config()# a request in flight while events arrive
+
+        self.assertEqual((await first)["data"]["entity_id"], "sensor.a")
+        self.assertIsNone(states)
+
+        await events.aclose()
+        self.assertEqual(self.manager.connection.sent[-1], {"id": self.manager.message_id - 1, "type": "unsubscribe_events", "subscription": subscription_id})
+        self.assertEqual(self.manager.subscribed_events, {})
+
+    async def test_failed_request(self):
+        self.handler = lambda message: [{"id": message["id"], "type": "result", "success": False, "error": {"code": "x"}}]
+        with self.assertRaises(Exception):
+            await self.manager.fetch_config()
+
+    async def test_state_mirror(self):
+        snapshot = [{"entity_id": "sensor.a", "state": "1"}, {"entity_id": "sensor.b", "state": "2"}]
+
+        def handler(message):
+            if message["type"] == "get_states":
+                return [result(message, snapshot)]
+            return [result(message)]
+
+        self.handler = handler
+        self.assertEqual((await self.manager.fetch_sensor_state("sensor.a")).state, "1")
+        self.assertTrue(self.manager.mirroring)
+
+        subscription_id = next(iter(self.manager.subscribed_events))
+        self.manager.connection.push({"id": subscription_id, "type": "event", "event": {
+            "data": {"entity_id": "sensor.a", "new_state": {"entity_id": "sensor.a", "state": "3"}}}})
+        self.manager.connection.push({"id": subscription_id, "type": "event", "event": {
+            "data": {"entity_id": "sensor.b", "new_state": None}}})
+        await asyncio.sleep(0.01)
+
+        sent = len(self.manager.connection.sent)
+        self.assertEqual((await self.manager.fetch_sensor_state("sensor.a")).state, "3")
+        self.assertIsNone(await self.manager.fetch_sensor_state("sensor.b"))
+        self.assertEqual(len(self.manager.connection.sent), sent)# served locally
+
+        await self.manager.stop_state_mirror()
+        self.assertFalse(self.manager.mirroring)
+        self.assertEqual(self.manager.subscribed_events, {})
+
+    async def test_ping_pong(self):
+        self.handler = lambda message: [{"id": message["id"], "type": "pong"}]
+        self.assertTrue(await self.manager.ping_pong())
+        self.handler = lambda message: []
+        self.assertFalse(await self.manager.ping_pong(timeout=0.01))
+
+    async def test_reconnect_restores_subscription(self):
+        class FakeDatabase:
+            def get_state_changes(self, entity_ids, start=None, end=None):
+                return [("sensor.a", datetime(2024, 1, 1, tzinfo=timezone.utc), "2", {})]
+
+        self.manager.dbmanager = FakeDatabase()
+        self.manager.heartbeat_interval = 0.01
+        entities = self.manager.subscribe_entities(["sensor.a"])
+        update = asyncio.ensure_future(entities.__anext__())
+        await asyncio.sleep(0)
+        old_id = self.manager.connection.sent[-1]["id"]
+        self.manager.connection.push({"id": old_id, "type": "event", "event": {"a": {"sensor.a": {"s": "1", "lc": 0}}}})
+        self.assertEqual((await update)[1].state, "1")
+
+        replacement = FakeConnection(lambda message: [] if message["type"] == "auth" else [result(message)])
+        replacement.push({"type": "auth_required"})
+        replacement.push({"type": "auth_ok"})
+        with patch("data_management.SensorDataManager.websockets.connect", AsyncMock(return_value=replacement)):
+            self.manager._supervisor_task = asyncio.create_task(self.manager._SensorDataManager__supervise())
+            await self.manager.connection.close()# the socket drops
+            entity_id, state = await asyncio.wait_for(entities.__anext__(), 1)# replayed from the database
+            self.assertEqual((entity_id, state.state), ("sensor.a", "2"))
+
+        new_id = next(iter(self.manager.subscribed_events))
+        self.assertNotEqual(new_id, old_id)
+        self.assertEqual(replacement.sent[-1], {"id": new_id, "type": "subscribe_entities", "entity_ids": ["sensor.a"]})
+        replacement.push({"id": new_id, "type": "event", "event": {"c": {"sensor.a": {"+": {"s": "3"}}}}})
+        self.assertEqual((await asyncio.wait_for(entities.__anext__(), 1))[1].state, "3")
+        await entities.aclose()
+
+    async def test_backfill_from_last_message_without_duplicates(self):
+        loop = asyncio.get_running_loop()
+        replacement = FakeConnection(lambda message: [] if message["type"] == "auth" else [result(message)])
+        replacement.push({"type": "auth_required"})
+        replacement.push({"type": "auth_ok"})
+        starts = []
+
+        class FakeDatabase:
+            def get_state_changes(self, entity_ids, start=None, end=None):
+                starts.append(start)
+                # the change at t=200 also arrives live while the backfill is running
+                live = {"id": replacement.sent[-1]["id"], "type": "event", "event": {"c": {"sensor.a": {"+": {"s": "3", "lc": 200.0}}}}}
+                loop.call_soon_threadsafe(replacement.push, live)
+                time.sleep(0.05)
+                return [
+                    ("sensor.a", datetime.fromtimestamp(100, timezone.utc), "2", {}),
+                    ("sensor.a", datetime.fromtimestamp(200, timezone.utc), "3", {}),
+                ]
+
+        self.manager.dbmanager = FakeDatabase()
+        self.manager.heartbeat_interval = 0.01
+        entities = self.manager.subscribe_entities(["sensor.a"])
+        update = asyncio.ensure_future(entities.__anext__())
+        await asyncio.sleep(0)
+        old_id = self.manager.connection.sent[-1]["id"]
+        self.manager.connection.push({"id": old_id, "type": "event", "event": {"a": {"sensor.a": {"s": "1", "lc": 0}}}})
+        await update
+
+        with patch("data_management.SensorDataManager.websockets.connect", AsyncMock(return_value=replacement)):
+            self.manager._supervisor_task = asyncio.create_task(self.manager._SensorDataManager__supervise())
+            dropped = datetime.now(timezone.utc)
+            await self.manager.connection.close()
+            states = [(await asyncio.wait_for(entities.__anext__(), 1))[1].state for _ in range(2)]
+
+        self.assertLessEqual(starts[0], dropped)# not from when the drop was noticed
+        self.assertEqual(states, ["2", "3"])
+        new_id = next(iter(self.manager.subscribed_events))
+        replacement.push({"id": new_id, "type": "event", "event": {"c": {"sensor.a": {"+": {"s": "4"}}}}})
+        self.assertEqual((await asyncio.wait_for(entities.__anext__(), 1))[1].state, "4")# "3" was not queued twice
+        await entities.aclose()
+
+
+class TestEntityState(unittest.TestCase):
+
+    def test_from_dict(self):
+        state = EntityState.from_dict({
+            "entity_id": "sensor.a", "state": "21.5", "last_changed": "2024-01-01T00:00:00+00:00",
+            "last_updated": "2024-01-01T00:00:00+00:00", "attributes": {"unit_of_measurement": "°C"},
+        })
+        self.assertEqual(state.state, "21.5")
+        self.assertEqual(state.last_changed, 1704067200.0)
+        self.assertEqual(state.attributes, {"unit_of_measurement": "°C"})
+        self.assertFalse(hasattr(state, "__dict__"))
+
+    def test_without_attributes(self):
+        state = EntityState("sensor.a", "on", 1704067200.0)
+        self.assertEqual(state.attributes, {})
+        self.assertEqual(state, EntityState.from_dict(state.as_dict()))
+
+
+if __name__ == '__main__':
+    unittest.main()
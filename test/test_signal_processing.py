@@ -76,6 +76,71 @@ class TestSignalProcessing(unittest.TestCase):
     #     max_lag_index = np.argmax(cross_corr_result)
     #     self.assertEqual(max_lag_index, expected_lag_index)
 
+    def test_cross_correlation_fft(self):
+        rng = np.random.default_rng(0)
+        times = np.arange(500, dtype=np.int64) * 1_000_000_000
+        x = rng.standard_normal(500)
+        y = np.roll(x, 3) + 0.1 * rng.standard_normal(500)
+        sensor1, sensor2 = Sensor.from_arrays(times, x), Sensor.from_arrays(times, y)
+
+        result = SignalProcessing.cross_correlation(sensor1, sensor2, lags_percentage=10)
+        direct = np.correlate(x - x.mean(), y - y.mean(), mode='full') / (x.std() * y.std() * 500)
+        np.testing.assert_allclose(result, direct[499 - 50: 499 + 51], atol=1e-12)
+        self.assertEqual(np.argmax(result) - 50, -3)
+
+        matrix = SignalProcessing.cross_correlation_matrix([sensor1, sensor2], max_lag=5)
+        self.assertEqual(matrix.shape, (2, 2, 11))
+        np.testing.assert_allclose(matrix[0, 1], result[45:56], atol=1e-12)
+        np.testing.assert_allclose(matrix[:, :, 5].diagonal(), [1.0, 1.0])
+
+    def test_auto_correlation_arrays(self):
+        from statsmodels.tsa.stattools import acf, pacf
+
+        rng = np.random.default_rng(1)
+        noise = rng.standard_normal((1000, 2))
+        ar = np.zeros(1000)
+        for i in range(1, 1000):
+            ar[i] = 0.7 * ar[i - 1] + noise[i, 0]
+
+        np.testing.assert_allclose(SignalProcessing.auto_correlation(ar, lags=10), acf(ar, nlags=10, fft=True))
+        np.testing.assert_allclose(SignalProcessing.partial_auto_correlation(ar, lags=5), pacf(ar, nlags=5, method='ldb'))
+
+        batch = SignalProcessing.auto_correlation(np.column_stack([ar, noise[:, 1]]), lags=3)
+        self.assertEqual(batch.shape, (4, 2))
+        np.testing.assert_allclose(batch[:, 0], acf(ar, nlags=3, fft=True))
+
+    def test_ljung_box(self):
+        rng = np.random.default_rng(2)
+        white = rng.standard_normal(500)
+        walk = np.cumsum(rng.standard_normal(500))
+        result = SignalProcessing.ljung_box(np.column_stack([white, walk]), lags=10)
+        self.assertGreater(result['p-value'][0], 0.05)
+        self.assertLess(result['p-value'][1], 0.05)
+        self.assertIsInstance(SignalProcessing.ljung_box(white)['p-value'], float)
+
+    def test_ljung_box_short_series(self):
+        short = np.array([1.0, -2.0, 0.5, 3.0, -1.0])
+        self.assertEqual(SignalProcessing.ljung_box(short, lags=10), SignalProcessing.ljung_box(short, lags=4))# clamped to n - 1
+        with self.assertRaises(ValueError):
+            SignalProcessing.ljung_box(short[:1])
+
+    def test_analysis_cache(self):
+        sensor = Sensor.from_arrays(np.arange(200, dtype=np.int64) * 1_000_000_000, np.sin(np.arange(200) / 5))
+        detrended = SignalProcessing.detrend(sensor)
+        self.assertIs(SignalProcessing.detrend(sensor), detrended)
+        self.assertIs(SignalProcessing.psd(sensor)[1], SignalProcessing.psd(sensor)[1])
+        self.assertFalse(detrended.flags.writeable)
+
+        reads = []
+        get_timeseries = sensor.get_timeseries
+        sensor.get_timeseries = lambda numpy=False: reads.append(numpy) or get_timeseries(numpy)
+        SignalProcessing.detrend(sensor)
+        self.assertEqual(reads, [])# a cache hit doesn't touch the samples
+        del sensor.get_timeseries
+
+        sensor.update_series(pd.Timestamp(200, unit='s', tz='UTC'), 0.0)# new data invalidates the cache
+        self.assertEqual(len(SignalProcessing.detrend(sensor)), 201)
+        self.assertEqual(len(SignalProcessing.fourier_transform(sensor)), 100)
 
 
 if __name__ == '__main__':
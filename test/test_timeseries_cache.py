@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data_management.DatabaseManager import DatabaseManager
+from data_management.TimeseriesCache import TimeseriesCache
+
+
+class TestTimeseriesCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = TimeseriesCache(self.directory.name)
+        self.times = np.arange(10, dtype=np.int64) * 1_000_000_000
+        self.states = np.arange(10, dtype=np.float64)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_empty(self):
+        self.assertIsNone(self.cache.last_time("sensor.missing"))
+        times, states = self.cache.load("sensor.missing")
+        self.assertEqual(times.size, 0)
+        self.assertEqual(states.size, 0)
+
+    def test_incremental_append(self):
+        self.cache.append("sensor.a", self.times[:6], self.states[:6])
+        self.assertEqual(self.cache.last_time("sensor.a"), self.times[5])
+
+        # overlapping samples are ignored, only the new ones are appended
+        self.cache.append("sensor.a", self.times[4:], self.states[4:])
+        times, states = self.cache.load("sensor.a")
+        np.testing.assert_array_equal(times, self.times)
+        np.testing.assert_array_equal(states, self.states)
+
+    def test_load_window(self):
+        self.cache.append("sensor.a", self.times, self.states)
+        times, states = self.cache.load("sensor.a", start=self.times[2], end=self.times[5])
+        np.testing.assert_array_equal(times, self.times[2:5])
+        np.testing.assert_array_equal(states, self.states[2:5])
+
+    def test_interrupted_append(self):
+        self.cache.append("sensor.a", self.times[:5], self.states[:5])
+        # simulate a crash after the states were written but before the times were
+        with open(os.path.join(self.directory.name, "sensor.a", "state.f8"), "ab") as file:
+            file.write(self.states[5:7].tobytes())
+
+        self.assertEqual(self.cache.last_time("sensor.a"), self.times[4])
+        self.cache.append("sensor.a", self.times[5:], self.states[5:])
+        times, states = self.cache.load("sensor.a")
+        np.testing.assert_array_equal(times, self.times)
+        np.testing.assert_array_equal(states, self.states)
+
+
+class TestSyncCache(unittest.TestCase):
+    """
+    `DatabaseManager._sync_cache` with the database queries replaced by a recording stub.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbmanager = DatabaseManager.__new__(DatabaseManager)
+        self.dbmanager.cache = TimeseriesCache(self.directory.name)
+        self.queries = []
+
+        def stream_arrays(sensor, start, end, chunk_size):
+            self.queries.append(([sensor], start, None))
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        def stream_many(entity_ids, start, end, chunk_size, since=None):
+            self.queries.append((entity_ids, start, since))
+            return {entity_id: (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)) for entity_id in entity_ids}
+
+        self.dbmanager._stream_arrays = stream_arrays
+        self.dbmanager._stream_many = stream_many
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cached_entities_fetch_from_their_own_last_sample(self):
+        self.dbmanager.cache.append("sensor.a", [1_000_000_000], [1.0])
+        self.dbmanager.cache.append("sensor.b", [5_000_000_000], [1.0])
+        self.dbmanager._sync_cache(["sensor.a", "sensor.b", "sensor.new"], None, 100)
+
+        self.assertIn((["sensor.new"], None, None), self.queries)# only the uncached entity is fetched in full
+        self.assertIn((["sensor.a", "sensor.b"], None, {"sensor.a": 1_000_000_000, "sensor.b": 5_000_000_000}), self.queries)
+        self.assertEqual(len(self.queries), 2)
+
+    def test_covered_entities_are_not_queried(self):
+        self.dbmanager.cache.append("sensor.a", [1_000_000_000], [1.0])
+        self.dbmanager.cache.append("sensor.b", [5_000_000_000], [1.0])
+        self.dbmanager._sync_cache(["sensor.a", "sensor.b"], 2_000_000_000, 100)
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(self.queries[0][0], ["sensor.a"])
+
+    def test_get_timeseries_served_from_cache(self):
+        self.dbmanager.cache.append("sensor.a", np.array([0, 1, 2]) * 1_000_000_000, [1.0, np.nan, 3.0])
+        df = self.dbmanager.get_timeseries("sensor.a", start="1970-01-01 00:00:01", end="1970-01-01 00:00:02", resample=None)
+        self.assertEqual(self.queries, [])# the cache already covers the window
+        self.assertEqual(df.index.tolist(), [pd.Timestamp(1, unit='s', tz='UTC')])
+        self.assertTrue(np.isnan(df['state'].iloc[0]))
+
+        df = self.dbmanager.get_timeseries("sensor.a")# open-ended, so only newer samples are asked for
+        self.assertEqual(self.queries, [(["sensor.a"], pd.Timestamp(2_000_001_000, tz='UTC'), None)])
+        self.assertEqual(df['state'].tolist()[::2], [1.0, 3.0])
+
+    def test_naive_bounds_are_utc(self):
+        self.assertEqual(DatabaseManager._to_nanoseconds("1970-01-01 00:00:01"), 1_000_000_000)
+        self.assertEqual(DatabaseManager._to_utc("1970-01-01 01:00:01+01:00").value, 1_000_000_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
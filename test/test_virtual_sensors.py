@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from peripherals.virtual_sensors import generate_virtual_sensors
+
+
+class TestGenerateVirtualSensors(unittest.TestCase):
+
+    def test_regular(self):
+        sensors = generate_virtual_sensors(3, duration=3600, sample_rate=[10, 30, 60], seed=1)
+        self.assertEqual([len(sensor.y) for sensor in sensors], [360, 120, 60])
+        self.assertEqual([sensor.get_timestep() for sensor in sensors], [10, 30, 60])
+        self.assertEqual(sensors[2].identifier, "sensor.virtual_2")
+
+    def test_seeded(self):
+        first = generate_virtual_sensors(2, duration=600, irregularity=0.5, dropout=0.2, drift=1, steps=2, seed=7)
+        second = generate_virtual_sensors(2, duration=600, irregularity=0.5, dropout=0.2, drift=1, steps=2, seed=7)
+        for a, b in zip(first, second):
+            np.testing.assert_array_equal(a.x, b.x)
+            np.testing.assert_array_equal(a.y, b.y)
+
+    def test_irregular_with_dropouts(self):
+        sensor, = generate_virtual_sensors(1, duration=86400, sample_rate=60, irregularity=0.5, dropout=0.3, seed=0)
+        gaps = np.diff(sensor.x).astype(np.int64) / 1e9
+        self.assertTrue(np.all(gaps > 0))
+        self.assertLess(len(sensor.y), 1440 * 0.8)
+        self.assertLess((sensor.x[-1] - sensor.x[0]).astype(np.int64) / 1e9, 86400)
+
+    def test_mixed_rates_each_cover_the_duration(self):
+        sensors = generate_virtual_sensors(3, duration=86400, sample_rate=[1, 60, 3600], irregularity=0.9, seed=3)
+        for sensor, rate in zip(sensors, [1, 60, 3600]):
+            span = (sensor.x[-1] - sensor.x[0]).astype(np.int64) / 1e9
+            self.assertGreater(span, 86400 - 2 * rate)
+            self.assertLess(span, 86400)
+            self.assertLess(len(sensor.y), 86400 / rate * 1.1)
+
+
+if __name__ == '__main__':
+    unittest.main()